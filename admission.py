@@ -0,0 +1,292 @@
+"""In-process admission control: per-client rate limits and concurrency caps.
+
+Each /api/ request takes a token from its client's bucket for its route,
+named by the path's first segment after /api/ ("time" for /api/time/London).
+A route takes its own limit when one is configured under its name, else the
+"api" limit; either way every client has a bucket per route, and a client
+whose bucket is empty gets a 429. Past max_concurrent requests in flight, further ones
+are shed with a 503. Event streams hold a thread for as long as they stay
+open, so they have caps of their own instead: max_streams per process and
+max_client_streams per client, past which they get a 503 or a 429. Every
+answer carries Retry-After, and every check is constant time and runs in
+front of Flask.
+
+Configured by TIMESPOT_RATE_LIMITS, e.g. "api=20:40,cities=2:10" (requests
+per second and burst per client) or "off", TIMESPOT_MAX_CONCURRENT ("0" for
+no cap) and TIMESPOT_MAX_STREAMS, e.g. "4:2" (per process and per client,
+"0" for no cap). The concurrency defaults leave some of a gunicorn worker's
+GUNICORN_THREADS free to answer refusals.
+
+Every limit is per process. Under gunicorn a client whose requests are
+spread over all WEB_CONCURRENCY workers can get up to that many times the
+configured rate. Clients are keyed by REMOTE_ADDR; behind a proxy,
+create_app() sets it from X-Forwarded-For (TIMESPOT_PROXY_HOPS).
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+import math
+import os
+import threading
+import time
+
+DEFAULT_LIMITS = "api=20:40,cities=2:10"
+
+# A gthread worker only runs requests on its pool threads (gunicorn.conf.py),
+# so caps at or above the thread count could never be reached. A quarter of
+# the threads may hold streams and an eighth stay free for refusals, /metrics
+# and static files.
+THREADS = int(os.environ.get("GUNICORN_THREADS", "16"))
+DEFAULT_MAX_STREAMS = f"{max(1, THREADS // 4)}:2"
+DEFAULT_MAX_CONCURRENT = max(1, THREADS - THREADS // 4 - THREADS // 8)
+
+# The metrics scrape must get through when the server is busiest. Static
+# files are exempt too, so servers can still send them with sendfile.
+EXEMPT_PATHS = frozenset({"/metrics"})
+
+STREAM_PATHS = frozenset({"/api/stream"})
+
+
+def parse_limits(value):
+    """{name: (rate, burst)} from "name=rate:burst,..."; "off" or "" for none"""
+    limits = {}
+    if value.strip().lower() in ("", "off"):
+        return limits
+    for item in value.split(","):
+        name, _, spec = item.partition("=")
+        rate, _, burst = spec.partition(":")
+        rate = float(rate)
+        limits[name.strip()] = (rate, float(burst) if burst else rate)
+    return limits
+
+
+def parse_stream_caps(value):
+    """(per process, per client) from "process:client"; 0 for no cap"""
+    process, _, client = value.partition(":")
+    return int(process), int(client or 0)
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (tokens, time of last update), least recently seen first
+        self.buckets = OrderedDict()
+
+
+class TokenBuckets:
+    """A token bucket per key, spread over independently locked shards.
+
+    Each shard keeps at most max_keys / shards buckets and forgets the least
+    recently seen client first; a forgotten client starts again full.
+    """
+
+    def __init__(self, rate, burst, shards=16, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self._shards = [_Shard() for _ in range(shards)]
+        self._per_shard = max(1, max_keys // shards)
+
+    def take(self, key, now=None):
+        """0 if key had a token (now taken), else seconds until it will have one"""
+        if now is None:
+            now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            buckets = shard.buckets
+            entry = buckets.get(key)
+            if entry is None:
+                tokens = self.burst
+                if len(buckets) >= self._per_shard:
+                    buckets.popitem(last=False)
+            else:
+                tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+                buckets.move_to_end(key)
+            if tokens >= 1:
+                buckets[key] = (tokens - 1, now)
+                return 0
+            buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.buckets.clear()
+
+
+class Admission:
+    """WSGI middleware that rate limits API routes per client and caps concurrent requests.
+
+    Refusals are answered before Flask sees the request, which makes them
+    an order of magnitude cheaper than any route.
+    """
+
+    def __init__(self, limits=None, max_concurrent=None, max_streams=None, max_client_streams=None):
+        if limits is None:
+            limits = parse_limits(os.environ.get("TIMESPOT_RATE_LIMITS", DEFAULT_LIMITS))
+        if max_concurrent is None:
+            max_concurrent = int(os.environ.get("TIMESPOT_MAX_CONCURRENT", DEFAULT_MAX_CONCURRENT))
+        stream_caps = parse_stream_caps(os.environ.get("TIMESPOT_MAX_STREAMS", DEFAULT_MAX_STREAMS))
+        if max_streams is None:
+            max_streams = stream_caps[0]
+        if max_client_streams is None:
+            max_client_streams = stream_caps[1]
+        self.buckets = {name: TokenBuckets(rate, burst) for name, (rate, burst) in limits.items()}
+        self.max_concurrent = max_concurrent
+        self.max_streams = max_streams
+        self.max_client_streams = max_client_streams
+        self.in_flight = 0
+        self.streams = 0
+        # Open streams by client, without the clients that have none
+        self._client_streams = {}
+        # A bare lock and counter: threading.Semaphore is several times slower
+        self._lock = threading.Lock()
+        self.enabled = bool(self.buckets) or max_concurrent > 0 or max_streams > 0 or max_client_streams > 0
+        self._suspended = False
+        self._routes = frozenset()
+        # Approximate under concurrency, like any unlocked counter
+        self.refused = {"rate_limited": 0, "shed": 0, "streams": 0}
+
+    def init_app(self, app):
+        """Wrap app's WSGI callable; call it once the app's /api/ routes are registered"""
+        if not self.enabled:
+            return
+        # Paths that match no route share one bucket, so that made-up
+        # routes do not each start a client with a full one
+        self._routes = frozenset(
+            rule.rule.split("/")[2] for rule in app.url_map.iter_rules() if rule.rule.startswith("/api/")
+        )
+        wsgi_app = app.wsgi_app
+
+        def admit(environ, start_response):
+            path = environ.get("PATH_INFO", "")
+            if self._suspended or path in EXEMPT_PATHS or path.startswith("/static/"):
+                return wsgi_app(environ, start_response)
+            client = environ.get("REMOTE_ADDR")
+            buckets, key = self._limit(path, client)
+            if buckets is not None:
+                wait = buckets.take(key)
+                if wait:
+                    self.refused["rate_limited"] += 1
+                    return _refuse(start_response, "429 Too Many Requests", _RATE_LIMITED, wait)
+            if path in STREAM_PATHS:
+                return self._stream(client, wsgi_app, environ, start_response)
+            if self.max_concurrent <= 0:
+                return wsgi_app(environ, start_response)
+            with self._lock:
+                admitted = self.in_flight < self.max_concurrent
+                if admitted:
+                    self.in_flight += 1
+            if not admitted:
+                self.refused["shed"] += 1
+                return _refuse(start_response, "503 Service Unavailable", _BUSY, 1)
+            try:
+                return _Held(wsgi_app(environ, start_response), self._release)
+            except BaseException:
+                self._release()
+                raise
+
+        app.wsgi_app = admit
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _stream(self, client, wsgi_app, environ, start_response):
+        with self._lock:
+            open_streams = self._client_streams.get(client, 0)
+            if 0 < self.max_client_streams <= open_streams:
+                refusal = ("429 Too Many Requests", _TOO_MANY_STREAMS)
+            elif 0 < self.max_streams <= self.streams:
+                refusal = ("503 Service Unavailable", _BUSY)
+            else:
+                refusal = None
+                self.streams += 1
+                self._client_streams[client] = open_streams + 1
+        if refusal is not None:
+            self.refused["streams"] += 1
+            # Streams only free up as their clients leave
+            return _refuse(start_response, *refusal, 5)
+        release = partial(self._close_stream, client)
+        try:
+            return _Held(wsgi_app(environ, start_response), release)
+        except BaseException:
+            release()
+            raise
+
+    def _close_stream(self, client):
+        with self._lock:
+            self.streams -= 1
+            open_streams = self._client_streams.pop(client) - 1
+            if open_streams:
+                self._client_streams[client] = open_streams
+
+    @contextmanager
+    def suspended(self):
+        """Admit everything inside the block (for warming up), then start from full buckets"""
+        self._suspended = True
+        try:
+            yield
+        finally:
+            self._suspended = False
+            for buckets in self.buckets.values():
+                buckets.clear()
+
+    def _limit(self, path, client):
+        """(buckets, key) for a request, or (None, None) when it is not limited"""
+        if not path.startswith("/api/"):
+            return None, None
+        route = path.split("/", 3)[2]
+        if route not in self._routes:
+            route = ""
+        buckets = self.buckets.get(route)
+        if buckets is not None:
+            return buckets, client
+        return self.buckets.get("api"), (client, route)
+
+
+class _Held:
+    """A response body that gives back its concurrency slot once it has been
+    sent in full or closed, whichever comes first"""
+
+    def __init__(self, iterable, release):
+        self._iterable = iterable
+        self._iterator = iter(iterable)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._done()
+            raise
+
+    def close(self):
+        try:
+            close = getattr(self._iterable, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._done()
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+_RATE_LIMITED = b'{"error":"Too many requests"}\n'
+_BUSY = b'{"error":"Server busy"}\n'
+_TOO_MANY_STREAMS = b'{"error":"Too many open streams"}\n'
+
+
+def _refuse(start_response, status, body, retry_after):
+    start_response(status, [
+        ("Content-Type", "application/json"),
+        ("Content-Length", str(len(body))),
+        ("Retry-After", str(max(1, math.ceil(retry_after)))),
+        ("Cache-Control", "no-store"),
+    ])
+    return [body]
@@ -1,47 +1,79 @@
-from flask import Flask, jsonify
-from datetime import datetime
-import pytz
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, stream_with_context
+from admission import Admission
+from cache import LRUCache
+from cities import open_registry
+from collections import Counter
+from convert import MAX_TS, MIN_TS, convert_stream, parse_instant, read_ndjson
+from dashboards import COOKIE as DASHBOARD_COOKIE, Dashboard, DashboardStore, cookie_value, new_user_id, parse_cookie
+from datetime import datetime, timezone
+from functools import lru_cache
+from geo import GridIndex
+from html import escape
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from overlap import overlaps
+from payload import JSONObjectFragments, Payload
+from profiling import Profiler
+from search import SearchIndex
+from shared import CITY_ROW, ZONE_ROW, SnapshotTable
+from werkzeug.middleware.proxy_fix import ProxyFix
+import formats
+import gc
+import hashlib
 import json
+import numpy as np
+import os
+import re
+import sun
+import threading
+import time
+import zones
 
-app = Flask(__name__)
-
-# World cities with their timezones and coordinates
-WORLD_CITIES = {
-    "London": {"timezone": "Europe/London", "country": "United Kingdom", "lat": 51.5074, "lon": -0.1278},
-    "New York": {"timezone": "America/New_York", "country": "United States", "lat": 40.7128, "lon": -74.0060},
-    "Los Angeles": {"timezone": "America/Los_Angeles", "country": "United States", "lat": 34.0522, "lon": -118.2437},
-    "Paris": {"timezone": "Europe/Paris", "country": "France", "lat": 48.8566, "lon": 2.3522},
-    "Tokyo": {"timezone": "Asia/Tokyo", "country": "Japan", "lat": 35.6762, "lon": 139.6503},
-    "Sydney": {"timezone": "Australia/Sydney", "country": "Australia", "lat": -33.8688, "lon": 151.2093},
-    "Dubai": {"timezone": "Asia/Dubai", "country": "UAE", "lat": 25.2048, "lon": 55.2708},
-    "Moscow": {"timezone": "Europe/Moscow", "country": "Russia", "lat": 55.7558, "lon": 37.6176},
-    "Singapore": {"timezone": "Asia/Singapore", "country": "Singapore", "lat": 1.3521, "lon": 103.8198},
-    "Hong Kong": {"timezone": "Asia/Hong_Kong", "country": "Hong Kong", "lat": 22.3193, "lon": 114.1694},
-    "Karachi": {"timezone": "Asia/Karachi", "country": "Pakistan", "lat": 24.8607, "lon": 67.0011},
-    "Mumbai": {"timezone": "Asia/Kolkata", "country": "India", "lat": 19.0760, "lon": 72.8777},
-    "Beijing": {"timezone": "Asia/Shanghai", "country": "China", "lat": 39.9042, "lon": 116.4074},
-    "Toronto": {"timezone": "America/Toronto", "country": "Canada", "lat": 43.6532, "lon": -79.3832},
-    "São Paulo": {"timezone": "America/Sao_Paulo", "country": "Brazil", "lat": -23.5505, "lon": -46.6333},
-    "Mexico City": {"timezone": "America/Mexico_City", "country": "Mexico", "lat": 19.4326, "lon": -99.1332},
-    "Cairo": {"timezone": "Africa/Cairo", "country": "Egypt", "lat": 30.0444, "lon": 31.2357},
-    "Johannesburg": {"timezone": "Africa/Johannesburg", "country": "South Africa", "lat": -26.2041, "lon": 28.0473},
-    "Istanbul": {"timezone": "Europe/Istanbul", "country": "Turkey", "lat": 41.0082, "lon": 28.9784},
-    "Bangkok": {"timezone": "Asia/Bangkok", "country": "Thailand", "lat": 13.7563, "lon": 100.5018}
-}
-
-def get_city_time(city_name):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+bp = Blueprint("timespot", __name__)
+
+# World cities with their timezones and coordinates, memory-mapped from
+# data/cities.bin (see cities.py to build it from the seed table or GeoNames)
+WORLD_CITIES = open_registry()
+
+# Build every zone's transition table up front rather than on first request
+zones.preload(WORLD_CITIES.zone_names)
+
+# Sun times only change once per local day; warm today's before the first request
+sun_calendar = sun.SunCalendar(WORLD_CITIES)
+sun_calendar.precompute(WORLD_CITIES, int(time.time() // 86400), 1)
+
+# Prefix/trigram indexes behind /api/search
+search_index = SearchIndex(WORLD_CITIES)
+
+# Spatial index behind /api/nearest
+geo_index = GridIndex(WORLD_CITIES.lat, WORLD_CITIES.lon)
+
+# Every offset change of every city's zone, behind /api/transitions
+transition_calendar = zones.TransitionCalendar(WORLD_CITIES.zone_names)
+zone_cities = {}
+for city, zone_id in zip(WORLD_CITIES, WORLD_CITIES.zone_ids):
+    zone_cities.setdefault(WORLD_CITIES.zone_names[zone_id], []).append(city)
+
+def get_city_now(city_name, ts=None):
+    """Localize an epoch instant (default: the current one) to a city's timezone"""
+    if ts is None:
+        ts = time.time()
+    return zones.localize(WORLD_CITIES[city_name]["timezone"], ts)
+
+def get_city_time(city_name, now=None):
     """Get current time for a specific city"""
     if city_name not in WORLD_CITIES:
         return None
     
-    timezone = pytz.timezone(WORLD_CITIES[city_name]["timezone"])
-    now = datetime.now(timezone)
+    if now is None:
+        now = get_city_now(city_name)
     
     return {
         "time": now.strftime("%H:%M:%S"),
         "date": now.strftime("%A, %b %d %Y"),
-        "timezone": now.strftime("%Z%z"),
-        "utc_offset": now.strftime("%z")
+        "timezone": now.abbreviation + zones.format_offset(now.offset),
+        "utc_offset": zones.format_offset(now.offset)
     }
 
 def get_time_of_day(hour):
@@ -55,668 +87,1043 @@ def get_time_of_day(hour):
     else:
         return "Night"
 
-def get_sunrise_sunset(city_name):
-    """Get sunrise and sunset times for a city (simplified calculation)"""
+def get_sunrise_sunset(city_name, now=None):
+    """Get sunrise and sunset times for a city on its current local date"""
     if city_name not in WORLD_CITIES:
         return {"sunrise": "07:00", "sunset": "19:00", "duration": "12h 00m"}
     
-    timezone = pytz.timezone(WORLD_CITIES[city_name]["timezone"])
-    now = datetime.now(timezone)
-    hour = now.hour
+    if now is None:
+        now = get_city_now(city_name)
+    return sun_calendar.get(city_name, now.day)
+
+def get_times_for(cities, ts):
+    """Get time information for many cities at one shared epoch instant"""
+    # Group by timezone so each distinct zone is localized and formatted
+    # only once, however many cities share it.
+    by_zone = {}
+    for city in cities:
+        if city in WORLD_CITIES:
+            by_zone.setdefault(WORLD_CITIES[city]["timezone"], []).append(city)
     
-    if 3 <= now.month <= 9:  
-        sunrise_hour = 6
-        sunset_hour = 20
-    else:  
-        sunrise_hour = 7
-        sunset_hour = 18
+    times = {}
+    for members in by_zone.values():
+        now = get_city_now(members[0], ts)
+        zone_data = get_city_time(members[0], now)
+        zone_data["time_of_day"] = get_time_of_day(now.hour)
+        for city in members:
+            times[city] = dict(
+                zone_data,
+                sunrise_sunset=get_sunrise_sunset(city, now),
+                country=WORLD_CITIES[city]["country"],
+            )
+    return times
+
+def get_times_now(cities, ts=None):
+    """get_times_for() at the current instant, read from the ticker's snapshot when it is current"""
+    if ts is None:
+        ts = time.time()
+    published = ticker.snapshot(int(ts))
+    if published is None or profiler.active():
+        return get_times_for(cities, ts)
+    second = int(ts)
+    times = {}
+    for city in cities:
+        record = published.read(city)
+        if record is None:
+            continue
+        if record[0] != second:
+            # The next second was published mid-loop; one response must not
+            # mix two seconds
+            return get_times_for(cities, ts)
+        times[city] = record[2]
+    return times
+
+class TickBroadcaster:
+    """Shared once-a-second ticker that fans city times out to stream subscribers"""
     
-    sunrise = f"{sunrise_hour:02d}:{30 if hour % 2 == 0 else 45}"
-    sunset = f"{sunset_hour:02d}:{15 if hour % 2 == 0 else 30}"
-    duration = f"{sunset_hour - sunrise_hour}h {(sunset_hour - sunrise_hour) * 60 % 60:02d}m"
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._interest = Counter()
+        self._tick = (0, {})
+        self._thread = None
     
-    return {
-        "sunrise": sunrise,
-        "sunset": sunset,
-        "duration": duration
-    }
-
-@app.route('/')
-def index():
-    pakistan_time = get_city_time("Karachi")
-    pakistan_sunrise_sunset = get_sunrise_sunset("Karachi")
+    def subscribe(self, cities):
+        with self._cond:
+            self._interest.update(cities)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tick-broadcaster", daemon=True)
+                self._thread.start()
     
-    featured_cities = ["Karachi", "London", "New York", "Dubai"]
-    city_times = {}
+    def unsubscribe(self, cities):
+        with self._cond:
+            self._interest.subtract(cities)
+            self._interest += Counter()
     
-    for city in featured_cities:
-        if city in WORLD_CITIES:
-            time_data = get_city_time(city)
-            timezone = pytz.timezone(WORLD_CITIES[city]["timezone"])
-            now = datetime.now(timezone)
-            city_times[city] = {
-                "time": time_data["time"],
-                "time_of_day": get_time_of_day(now.hour),
-                "utc_offset": time_data["utc_offset"],
-                "country": WORLD_CITIES[city]["country"]
-            }
+    def wait(self, seq, timeout):
+        """Block until a tick newer than seq is published; None on timeout"""
+        with self._cond:
+            if self._tick[0] == seq:
+                self._cond.wait(timeout)
+            if self._tick[0] == seq:
+                return None
+            return self._tick
     
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>TimeSpot - Premium World Clock</title>
-        <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-        <style>
-            :root {{
-                --bg-gradient: linear-gradient(135deg, #0f172a 0%, #064e3b 100%);
-                --card-bg: rgba(255, 255, 255, 0.03);
-                --card-border: rgba(255, 255, 255, 0.1);
-                --text-main: #ffffff;
-                --text-muted: rgba(255, 255, 255, 0.7);
-                --accent: #3DDC84;
-                --accent-glow: rgba(61, 220, 132, 0.3);
-                --glass-shadow: 0 8px 32px 0 rgba(0, 0, 0, 0.3);
-            }}
-
-            * {{
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-                font-family: 'Outfit', sans-serif;
-            }}
-            
-            body {{ 
-                background: var(--bg-gradient);
-                min-height: 100vh;
-                color: var(--text-main);
-                transition: all 0.5s ease;
-                position: relative;
-                overflow-x: hidden;
-            }}
-            
-            /* Animated Background Glowing Orbs */
-            body::before, body::after {{
-                content: '';
-                position: fixed;
-                width: 600px;
-                height: 600px;
-                border-radius: 50%;
-                filter: blur(100px);
-                z-index: 0;
-                animation: float 20s infinite alternate ease-in-out;
-            }}
-            
-            body::before {{
-                top: -100px;
-                right: -100px;
-                background: radial-gradient(circle, var(--accent-glow) 0%, transparent 70%);
-            }}
-            
-            body::after {{
-                bottom: -150px;
-                left: -150px;
-                background: radial-gradient(circle, rgba(16, 185, 129, 0.2) 0%, transparent 70%);
-                animation-delay: -10s;
-            }}
-
-            @keyframes float {{
-                0% {{ transform: translate(0, 0) scale(1); }}
-                50% {{ transform: translate(-50px, 50px) scale(1.1); }}
-                100% {{ transform: translate(50px, -50px) scale(0.9); }}
-            }}
-            
-            /* White Theme Colors */
-            body.white-theme {{
-                --bg-gradient: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%);
-                --card-bg: rgba(255, 255, 255, 0.7);
-                --card-border: rgba(255, 255, 255, 1);
-                --text-main: #0f172a;
-                --text-muted: #64748b;
-                --accent: #059669;
-                --accent-glow: rgba(5, 150, 105, 0.15);
-                --glass-shadow: 0 10px 30px 0 rgba(148, 163, 184, 0.3);
-            }}
-            
-            /* Orange/Sunset Theme Colors */
-            body.orange-theme {{
-                --bg-gradient: linear-gradient(135deg, #2d1305 0%, #7c2d12 100%);
-                --card-bg: rgba(255, 255, 255, 0.05);
-                --card-border: rgba(255, 255, 255, 0.15);
-                --text-main: #ffffff;
-                --text-muted: rgba(255, 255, 255, 0.8);
-                --accent: #fb923c;
-                --accent-glow: rgba(251, 146, 60, 0.3);
-                --glass-shadow: 0 8px 32px 0 rgba(0, 0, 0, 0.4);
-            }}
-            
-            .container {{
-                max-width: 1100px;
-                margin: 0 auto;
-                padding: 30px 20px;
-                position: relative;
-                z-index: 1;
-            }}
-            
-            /* Enhanced Header */
-            .header {{
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                margin-bottom: 50px;
-                background: var(--card-bg);
-                backdrop-filter: blur(16px);
-                -webkit-backdrop-filter: blur(16px);
-                padding: 15px 25px;
-                border-radius: 100px;
-                border: 1px solid var(--card-border);
-                box-shadow: var(--glass-shadow);
-                transition: all 0.3s ease;
-            }}
-            
-            .logo {{
-                display: flex;
-                align-items: center;
-                gap: 12px;
-                font-size: 24px;
-                font-weight: 700;
-                color: var(--text-main);
-                letter-spacing: -0.5px;
-            }}
-            
-            .logo-icon {{
-                width: 42px;
-                height: 42px;
-                background: var(--accent);
-                border-radius: 50%;
-                display: flex; 
-                align-items: center;
-                justify-content: center; 
-                font-size: 22px;
-                color: #fff;
-                box-shadow: 0 0 15px var(--accent-glow);
-            }}
-            
-            /* Enhanced Search Bar */
-            .search-bar {{
-                flex: 1;
-                max-width: 450px;
-                margin: 0 20px;
-                position: relative;
-            }}
-            
-            .search-bar input {{
-                width: 100%;
-                padding: 14px 20px 14px 45px;
-                border: 1px solid var(--card-border);
-                border-radius: 50px;
-                background: rgba(255, 255, 255, 0.05);
-                font-size: 15px;
-                outline: none;
-                color: var(--text-main);
-                transition: all 0.3s ease;
-            }}
-
-            body.white-theme .search-bar input {{
-                background: rgba(255, 255, 255, 0.8);
-            }}
-            
-            .search-bar input:focus {{
-                background: rgba(255, 255, 255, 0.1);
-                border-color: var(--accent);
-                box-shadow: 0 0 0 3px var(--accent-glow);
-            }}
-
-            .search-bar::before {{
-                content: '🔍';
-                position: absolute;
-                left: 15px;
-                top: 50%;
-                transform: translateY(-50%);
-                font-size: 16px;
-                opacity: 0.6;
-            }}
-            
-            .header-buttons {{
-                display: flex;
-                gap: 12px;
-                align-items: center;
-            }}
-            
-            .theme-controls {{
-                display: flex;
-                gap: 8px;
-                background: rgba(0,0,0,0.1);
-                padding: 5px;
-                border-radius: 30px;
-                margin-right: 15px;
-            }}
-            
-            body.white-theme .theme-controls {{ background: rgba(0,0,0,0.05); }}
-
-            .theme-btn {{
-                padding: 8px 16px;
-                border: none;
-                border-radius: 20px;
-                background: transparent;
-                color: var(--text-muted);
-                font-weight: 500;
-                cursor: pointer;
-                transition: all 0.3s ease;
-                font-size: 13px;
-            }}
-            
-            .theme-btn:hover {{ color: var(--text-main); }}
-            
-            .theme-btn.active {{
-                background: var(--card-bg);
-                color: var(--text-main);
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                border: 1px solid var(--card-border);
-            }}
-            
-            .btn {{
-                padding: 12px 24px;
-                border: none;
-                border-radius: 30px;
-                background: rgba(255, 255, 255, 0.1);
-                color: var(--text-main);
-                font-weight: 600;
-                font-size: 14px;
-                cursor: pointer;
-                transition: all 0.3s ease;
-                border: 1px solid var(--card-border);
-            }}
-            
-            .btn-primary {{
-                background: var(--accent);
-                color: #fff;
-                border: none;
-                box-shadow: 0 4px 15px var(--accent-glow);
-            }}
-
-            .btn:hover {{
-                transform: translateY(-2px);
-                background: rgba(255, 255, 255, 0.2);
-            }}
-
-            .btn-primary:hover {{
-                background: var(--accent);
-                filter: brightness(1.1);
-            }}
-            
-            /* Premium Main Clock Area */
-            .main-clock {{
-                background: var(--card-bg);
-                border-radius: 40px;
-                padding: 70px 40px;
-                margin-bottom: 50px;
-                text-align: center;
-                box-shadow: var(--glass-shadow);
-                backdrop-filter: blur(20px);
-                -webkit-backdrop-filter: blur(20px);
-                border: 1px solid var(--card-border);
-                position: relative;
-                overflow: hidden;
-            }}
-            
-            .main-clock::before {{
-                content: '';
-                position: absolute;
-                top: 0; left: 0; right: 0;
-                height: 4px;
-                background: linear-gradient(90deg, transparent, var(--accent), transparent);
-                opacity: 0.8;
-            }}
-            
-            .main-time {{
-                font-size: 140px;
-                font-weight: 300;
-                color: var(--text-main);
-                margin-bottom: 10px;
-                letter-spacing: -4px;
-                font-variant-numeric: tabular-nums;
-                text-shadow: 0 10px 30px rgba(0,0,0,0.2);
-                line-height: 1;
-            }}
-            
-            .main-location {{
-                font-size: 36px;
-                color: var(--text-main);
-                margin-bottom: 8px;
-                font-weight: 600;
-                letter-spacing: -0.5px;
-            }}
-            
-            .main-date {{
-                font-size: 20px;
-                color: var(--text-muted);
-                margin-bottom: 25px;
-                font-weight: 400;
-            }}
-            
-            .sun-info {{
-                display: inline-flex;
-                align-items: center;
-                gap: 15px;
-                background: rgba(0,0,0,0.2);
-                padding: 12px 25px;
-                border-radius: 50px;
-                font-size: 16px;
-                color: var(--text-main);
-                margin-bottom: 30px;
-                border: 1px solid var(--card-border);
-            }}
-
-            body.white-theme .sun-info {{ background: rgba(255,255,255,0.5); }}
-            
-            .format-toggles {{
-                display: flex;
-                gap: 10px;
-                justify-content: center;
-            }}
+    def _run(self):
+        while True:
+            time.sleep(1 - time.time() % 1)
+            with self._cond:
+                if not self._interest:
+                    self._thread = None
+                    return
+                cities = list(self._interest)
             
-            .format-btn {{
-                padding: 8px 20px;
-                border: 1px solid var(--card-border);
-                border-radius: 20px;
-                background: transparent;
-                color: var(--text-muted);
-                cursor: pointer;
-                transition: all 0.3s ease;
-                font-weight: 600;
-                font-size: 14px;
-            }}
-            
-            .format-btn.active {{
-                background: var(--accent);
-                color: #fff;
-                border-color: var(--accent);
-                box-shadow: 0 4px 15px var(--accent-glow);
-            }}
-            
-            .slogan {{
-                text-align: center;
-                font-size: 28px;
-                margin-bottom: 50px;
-                font-weight: 300;
-                background: linear-gradient(to right, var(--text-main), var(--text-muted));
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-            }}
-            
-            /* Enhanced Grid & Cards */
-            .cities-grid {{
-                display: grid;
-                grid-template-columns: repeat(auto-fill, minmax(250px, 1fr));
-                gap: 25px;
-                margin-bottom: 50px;
-            }}
-            
-            .city-card {{
-                background: var(--card-bg);
-                border-radius: 24px;
-                padding: 30px 25px;
-                text-align: center; 
-                transition: all 0.4s cubic-bezier(0.175, 0.885, 0.32, 1.275);
-                cursor: pointer;
-                backdrop-filter: blur(16px);
-                -webkit-backdrop-filter: blur(16px);
-                border: 1px solid var(--card-border);
-                box-shadow: var(--glass-shadow);
-                position: relative;
-                overflow: hidden;
-            }}
-            
-            .city-card:hover {{
-                transform: translateY(-10px) scale(1.02);
-                border-color: rgba(255, 255, 255, 0.3);
-            }}
-
-            .city-card::after {{
-                content: '';
-                position: absolute;
-                top: 0; left: 0; right: 0; bottom: 0;
-                background: radial-gradient(circle at top right, rgba(255,255,255,0.1), transparent 60%);
-                opacity: 0;
-                transition: opacity 0.3s ease;
-            }}
-
-            .city-card:hover::after {{ opacity: 1; }}
-            
-            .city-card.featured {{
-                border: 1px solid var(--accent);
-                box-shadow: 0 10px 30px var(--accent-glow);
-            }}
-            
-            .city-time {{
-                font-size: 46px;
-                font-weight: 300;
-                margin-bottom: 5px;
-                color: var(--text-main);
-                font-variant-numeric: tabular-nums;
-            }}
-            
-            .city-name {{
-                font-size: 22px;
-                font-weight: 600;
-                margin-bottom: 4px;
-                color: var(--text-main);
-            }}
-            
-            .city-country {{
-                font-size: 14px;
-                color: var(--text-muted);
-                margin-bottom: 15px;
-                font-weight: 400;
-            }}
-            
-            .city-time-of-day {{
-                font-size: 13px;
-                font-weight: 600;
-                padding: 6px 14px;
-                border-radius: 20px;
-                display: inline-block;
-                margin-bottom: 12px;
-                text-transform: uppercase;
-                letter-spacing: 1px;
-            }}
-            
-            .city-time-of-day.day {{ background: rgba(253, 224, 71, 0.2); color: #fde047; }}
-            .city-time-of-day.night {{ background: rgba(56, 189, 248, 0.2); color: #38bdf8; }}
-            .city-time-of-day.morning {{ background: rgba(251, 146, 60, 0.2); color: #fb923c; }}
-            .city-time-of-day.evening {{ background: rgba(192, 132, 252, 0.2); color: #c084fc; }}
-            
-            body.white-theme .city-time-of-day.day {{ background: #fef08a; color: #854d0e; }}
-            body.white-theme .city-time-of-day.night {{ background: #bae6fd; color: #075985; }}
-            body.white-theme .city-time-of-day.morning {{ background: #fed7aa; color: #9a3412; }}
-            body.white-theme .city-time-of-day.evening {{ background: #e9d5ff; color: #581c87; }}
-
-            .utc-offset {{
-                font-size: 13px;
-                color: var(--text-muted);
-                background: rgba(0,0,0,0.1);
-                padding: 4px 10px;
-                border-radius: 8px;
-            }}
-            
-            .add-city {{
-                background: transparent;
-                border: 2px dashed var(--card-border);
-                display: flex;
-                flex-direction: column;
-                justify-content: center;
-                align-items: center;
-                opacity: 0.7;
-            }}
-            
-            .add-city:hover {{
-                opacity: 1;
-                border-color: var(--text-muted);
-                background: rgba(255,255,255,0.05);
-            }}
-            
-            .add-city-icon {{
-                font-size: 40px;
-                margin-bottom: 10px;
-                font-weight: 300;
-            }}
-            
-            .add-city-text {{
-                font-size: 16px;
-                font-weight: 500;
-            }}
-            
-            /* Responsive */
-            @media (max-width: 900px) {{
-                .header {{ flex-wrap: wrap; border-radius: 20px; }}
-                .search-bar {{ order: 3; max-width: 100%; margin: 15px 0 0 0; }}
-            }}
-
-            @media (max-width: 768px) {{
-                .main-time {{ font-size: 80px; }}
-                .main-location {{ font-size: 28px; }}
-                .main-clock {{ padding: 40px 20px; }}
-                .slogan {{ font-size: 20px; }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">
-                    <div class="logo-icon">🕐</div>
-                    <span>TimeSpot</span>
-                </div>
-                <div class="header-buttons">
-                    <div class="theme-controls">
-                        <button class="theme-btn" onclick="setTheme('orange')">Sunset</button>
-                        <button class="theme-btn" onclick="setTheme('white')">Light</button>
-                        <button class="theme-btn active" onclick="setTheme('dark')">Dark</button>
-                    </div>
-                    <button class="btn">Log In</button>
-                    <button class="btn btn-primary">Get App</button>
-                </div>
-                <div class="search-bar">
-                    <input type="text" placeholder="Search for cities or timezones..." id="searchInput">
-                </div>
-            </div>
-            
-            <div class="main-clock">
-                <div class="main-time" id="mainTime">{pakistan_time["time"]}</div>
-                <div class="main-location">Karachi, {WORLD_CITIES["Karachi"]["country"]}</div>
-                <div class="main-date">{pakistan_time["date"]}</div>
-                <div class="sun-info">
-                    <span>☀️ {pakistan_sunrise_sunset["sunrise"]}</span>
-                    <span>-</span>
-                    <span>🌙 {pakistan_sunrise_sunset["sunset"]}</span>
-                    <span style="opacity:0.6; font-size: 14px; margin-left:10px;">({pakistan_sunrise_sunset["duration"]})</span>
-                </div>
-                <div class="format-toggles">
-                    <button class="format-btn" onclick="toggleFormat('12h')">12h</button>
-                    <button class="format-btn active" onclick="toggleFormat('24h')">24h</button>
-                </div>
-            </div>
-            
-            <div class="slogan">
-                Life moves fast. Stay on time, beautifully.
-            </div>
-            
-            <div class="cities-grid">
-                {''.join([f'''
-                <div class="city-card {'featured' if city == 'Karachi' else ''}" onclick="setMainCity('{city}')">
-                    <div class="city-time">{city_times[city]["time"]}</div>
-                    <div class="city-name">{city}</div>
-                    <div class="city-country">{city_times[city]["country"]}</div>
-                    <div class="city-time-of-day {city_times[city]["time_of_day"].lower()}">{city_times[city]["time_of_day"]}</div>
-                    <br>
-                    <span class="utc-offset">UTC{city_times[city]["utc_offset"]}</span>
-                </div>
-                ''' for city in city_times.keys()])}
-                
-                <div class="city-card add-city" onclick="document.getElementById('searchInput').focus()">
-                    <div class="add-city-icon">+</div>
-                    <div class="add-city-text">Add City</div>
-                </div>
-            </div>
-        </div>
+            # Serialize each city once per tick; subscribers only join fragments.
+            encoded = {
+                city: (data["date"] + data["time"], json.dumps(data))
+                for city, data in get_times_now(cities).items()
+            }
+            with self._cond:
+                self._tick = (self._tick[0] + 1, encoded)
+                self._cond.notify_all()
+
+broadcaster = TickBroadcaster()
+
+class SnapshotView:
+    """Reads of the published snapshot by city name"""
+    
+    __slots__ = ("table",)
+    
+    def __init__(self, table):
+        self.table = table
+    
+    def read(self, city):
+        """(epoch second, UTC offset in seconds, the same dict get_times_for()
+        builds) for city, or None if it is unknown"""
+        index = WORLD_CITIES.index_of(city)
+        if index < 0:
+            return None
+        second, zone_row, city_row = self.table.read(int(WORLD_CITIES.zone_ids[index]), index)
+        # zone_row[0] is the local day, which only the writer needs
+        offset = zone_row[1]
+        time_, date, time_of_day, timezone_, utc_offset = [field.rstrip(b"\0").decode() for field in zone_row[2:]]
+        sunrise, sunset, duration = [field.rstrip(b"\0").decode() for field in city_row]
+        return second, offset, {
+            "time": time_,
+            "date": date,
+            "timezone": timezone_,
+            "utc_offset": utc_offset,
+            "time_of_day": time_of_day,
+            "sunrise_sunset": {"sunrise": sunrise, "sunset": sunset, "duration": duration},
+            "country": WORLD_CITIES.country_names[WORLD_CITIES.country_ids[index]],
+        }
+    
+    def time_data(self, city):
+        """The same dict get_times_for() builds for city, or None if it is unknown"""
+        record = self.read(city)
+        return record[2] if record is not None else None
+
+class SnapshotTicker:
+    """Background thread that builds every zone's and city's rows for each
+    coming second and publishes them to the shared table on the boundary,
+    so requests only read it.
+    
+    Every worker runs one, but only the worker holding the table's writer
+    lock builds and publishes; the others just try to take over each second
+    in case the writer has died. Work per tick is one localization per zone;
+    a city's sun times are redone only when its local date changes.
+    """
+    
+    def __init__(self, table):
+        self.table = table
+        # Registry indexes of each zone's cities
+        order = np.argsort(WORLD_CITIES.zone_ids, kind="stable")
+        bounds = np.searchsorted(WORLD_CITIES.zone_ids[order], np.arange(len(WORLD_CITIES.zone_names) + 1))
+        self.zone_members = [order[bounds[i]:bounds[i + 1]] for i in range(len(WORLD_CITIES.zone_names))]
+        # The writer's rows for the next publish
+        self._zone_rows = np.zeros(len(WORLD_CITIES.zone_names), ZONE_ROW)
+        self._zone_rows["day"] = -1
+        self._city_rows = np.zeros(len(WORLD_CITIES), CITY_ROW)
+        self._pid = None
+        self._leading = False
+        self._stopped = threading.Event()
+        self._thread = None
+        # Only held while starting or stopping, never across a fork
+        self._lock = threading.Lock()
+    
+    def snapshot(self, second):
+        """A view of the published snapshot if it is for second, else None"""
+        if self._pid != os.getpid():
+            # First use in this process, or in a worker forked from the
+            # process that started the thread, which the fork did not copy
+            self.start()
+        return SnapshotView(self.table) if self.table.second == second else None
+    
+    def start(self):
+        with self._lock:
+            # Concurrent first requests all get here; only the first starts
+            # a thread, since the writer lock would let every thread of the
+            # leading process build and publish
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._leading = self.table.try_lead()
+            if self._leading:
+                second = int(time.time())
+                self.build(second)
+                self.table.publish(second, self._zone_rows, self._city_rows)
+            self._thread = threading.Thread(target=self._run, args=(self._pid,), name="snapshot-ticker", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the thread and wait for it, so that it holds no locks when the process forks"""
+        with self._lock:
+            self._stopped.set()
+            self._pid = None
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+            if self._leading:
+                self.table.resign()
+                self._leading = False
+    
+    def build(self, second):
+        stale = []
+        for zone_id, zone_name in enumerate(WORLD_CITIES.zone_names):
+            members = self.zone_members[zone_id]
+            if not len(members):
+                continue
+            now = zones.localize(zone_name, second)
+            fields = get_city_time(WORLD_CITIES.name_at(members[0]), now)
+            if self._zone_rows["day"][zone_id] != now.day:
+                stale.extend((int(index), now.day) for index in members)
+            self._zone_rows[zone_id] = (
+                now.day, now.offset, fields["time"], fields["date"], get_time_of_day(now.hour),
+                fields["timezone"], fields["utc_offset"]
+            )
         
-        <script>
-            let currentFormat = '24h';
-            let updateInterval;
-            let currentMainCity = 'Karachi';
-
-            function updateTime() {{
-                fetch(`/api/time/${{currentMainCity}}`)
-                    .then(response => response.json())
-                    .then(data => {{
-                        document.getElementById('mainTime').textContent = data.time;
-                    }})
-                    .catch(error => console.error('Error:', error));
-            }}
-            
-            function setTheme(theme) {{
-                document.body.className = ''; 
-                if (theme !== 'dark') {{
-                   document.body.classList.add(theme + '-theme');
-                }}
-                
-                document.querySelectorAll('.theme-btn').forEach(btn => btn.classList.remove('active'));
-                event.target.classList.add('active');
-            }}
-            
-            function toggleFormat(format) {{
-                currentFormat = format;
-                document.querySelectorAll('.format-btn').forEach(btn => btn.classList.remove('active'));
-                event.target.classList.add('active');
-            }}
-            
-            function setMainCity(city) {{
-                currentMainCity = city;
-                fetch(`/api/time/${{city}}`)
-                    .then(response => response.json())
-                    .then(data => {{
-                        document.getElementById('mainTime').textContent = data.time;
-                        document.querySelector('.main-location').textContent = `${{city}}, ${{data.country || ''}}`;
-                        document.querySelector('.main-date').textContent = data.date;
-                        
-                        // Update UI to highlight selected
-                        document.querySelectorAll('.city-card').forEach(c => c.classList.remove('featured'));
-                        // Simplistic matching for demo
-                        let cards = document.querySelectorAll('.city-name');
-                        cards.forEach(c => {{
-                            if(c.textContent === city) c.parentElement.classList.add('featured');
-                        }});
-                    }})
-                    .catch(error => console.error('Error:', error));
-            }}
-            
-            updateInterval = setInterval(updateTime, 1000);
-        </script>
-    </body>
-    </html>
+        entries = sun_calendar.get_many([(WORLD_CITIES.name_at(index), day) for index, day in stale])
+        for (index, _day), entry in zip(stale, entries):
+            self._city_rows[index] = (entry["sunrise"], entry["sunset"], entry["duration"])
+    
+    def _run(self, pid):
+        while not self._stopped.is_set() and self._pid == pid:
+            # Build next second's rows ahead of time, then publish them
+            # right on the boundary
+            upcoming = int(time.time()) + 1
+            if not self._leading:
+                self._leading = self.table.try_lead()
+            if self._leading:
+                self.build(upcoming)
+            delay = upcoming - time.time()
+            if delay > 0 and self._stopped.wait(delay):
+                return
+            if self._leading:
+                self.table.publish(upcoming, self._zone_rows, self._city_rows)
+
+# The current second's rows, in memory shared by every worker forked from
+# this process (see shared.py)
+snapshot_table = SnapshotTable(len(WORLD_CITIES.zone_names), len(WORLD_CITIES))
+ticker = SnapshotTicker(snapshot_table)
+
+MAX_NEAREST_POINTS = 10000
+MAX_DASHBOARD_CITIES = 24
+DASHBOARD_COOKIE_MAX_AGE = 400 * 86400
+MAX_TIME_QUERIES = 10000
+OFFSET_RESYNC_SECONDS = 6 * 3600
+FEATURED_WARM_UP = 50
+MAX_OVERLAP_CITIES = 100
+MAX_OVERLAP_DAYS = 366
+MAX_TRANSITION_DAYS = 3660
+
+# Visitors' saved dashboards (data/dashboards.sqlite3, or $TIMESPOT_DB); the
+# index page shows this one to anyone who has not saved their own
+dashboard_store = DashboardStore()
+DEFAULT_DASHBOARD = Dashboard(0, "Karachi", ["Karachi", "London", "New York", "Dubai"])
+
+# Serialized /api/time payloads keyed by (city, epoch second)
+snapshot_cache = LRUCache(maxsize=4096, name="time_snapshots")
+
+def static_url(filename):
+    """Content-versioned URL for a static asset, safe to cache as immutable"""
+    with open(os.path.join(BASE_DIR, "static", filename), "rb") as f:
+        version = hashlib.sha1(f.read()).hexdigest()[:12]
+    return f"/static/{filename}?v={version}"
+
+def compile_page(template_name, **static_fields):
+    """Split a page shell into literal chunks and slot names, filling static slots once"""
+    with open(os.path.join(BASE_DIR, "templates", template_name), encoding="utf-8") as f:
+        parts = re.split(r"\{\{ *(\w+) *\}\}", f.read())
+    
+    # Even indexes hold literal HTML, odd indexes the names of per-request slots
+    compiled = [parts[0]]
+    for name, literal in zip(parts[1::2], parts[2::2]):
+        if name in static_fields:
+            compiled[-1] += static_fields[name] + literal
+        else:
+            compiled.extend([name, literal])
+    return compiled
+
+def render_page(compiled, fields):
+    """Fill the per-request slots of a compiled page shell"""
+    chunks = compiled[:]
+    for i in range(1, len(chunks), 2):
+        chunks[i] = fields[chunks[i]]
+    return "".join(chunks)
+
+INDEX_PAGE = compile_page(
+    "index.html",
+    stylesheet_url=static_url("style.css"),
+    script_url=static_url("app.js"),
+)
+
+CITY_CARD = """
+            <div class="city-card {featured}" data-city="{city}" onclick="setMainCity(this.dataset.city)">
+                <div class="city-time">{time}</div>
+                <div class="city-name">{city}</div>
+                <div class="city-country">{country}</div>
+                <div class="city-time-of-day {time_of_day_class}">{time_of_day}</div>
+                <br>
+                <span class="utc-offset">UTC{utc_offset}</span>
+            </div>"""
+
+@bp.after_app_request
+def cache_static_assets(response):
+    # Versioned asset URLs change whenever the file does, so browsers and
+    # proxies may keep them forever.
+    if request.endpoint == "static" and request.args.get("v"):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+def load_dashboard():
+    """(user id, cookie version, dashboard) for the request; the default
+    dashboard when the visitor has not saved one"""
+    user_id, version = parse_cookie(request.cookies.get(DASHBOARD_COOKIE))
+    dashboard = dashboard_store.get(user_id, version) if user_id is not None else None
+    if dashboard is None:
+        return user_id, version, DEFAULT_DASHBOARD
+    if dashboard.main_city not in WORLD_CITIES or not all(city in WORLD_CITIES for city in dashboard.cities):
+        # Saved before the registry was rebuilt without some of its cities.
+        # Keeping the saved version leaves the visitor's cookie alone.
+        cities = [city for city in dashboard.cities if city in WORLD_CITIES]
+        if dashboard.main_city not in WORLD_CITIES or not cities:
+            dashboard = DEFAULT_DASHBOARD._replace(version=dashboard.version)
+        else:
+            dashboard = dashboard._replace(cities=cities)
+    return user_id, version, dashboard
+
+def sync_dashboard_cookie(response, user_id, version, dashboard):
+    """Point the cookie at the dashboard's current version, or drop it if the dashboard is gone"""
+    if user_id is None or dashboard.version == version:
+        return
+    if dashboard is DEFAULT_DASHBOARD:
+        response.delete_cookie(DASHBOARD_COOKIE)
+    else:
+        response.set_cookie(DASHBOARD_COOKIE, cookie_value(user_id, dashboard.version),
+                            max_age=DASHBOARD_COOKIE_MAX_AGE, httponly=True, samesite="Lax", secure=request.is_secure)
+
+@bp.route('/')
+def index():
+    user_id, version, dashboard = load_dashboard()
+    main_city, featured_cities = dashboard.main_city, dashboard.cities
+    
+    city_times = get_times_now([main_city] + featured_cities)
+    html_content = render_index(main_city, featured_cities, city_times)
+    response = Response(html_content, mimetype="text/html", headers={"Cache-Control": "no-cache"})
+    response.vary.add("Cookie")
+    sync_dashboard_cookie(response, user_id, version, dashboard)
+    return response
+
+def render_index(main_city, featured_cities, city_times):
+    """Index page HTML for a main city and cards for the featured ones"""
+    main_time = city_times[main_city]
+    
+    city_cards = "".join(
+        CITY_CARD.format(
+            featured="featured" if city == main_city else "",
+            city=escape(city),
+            time=city_times[city]["time"],
+            country=escape(city_times[city]["country"]),
+            time_of_day=city_times[city]["time_of_day"],
+            time_of_day_class=city_times[city]["time_of_day"].lower(),
+            utc_offset=city_times[city]["utc_offset"],
+        )
+        for city in featured_cities if city in city_times
+    )
+    
+    return render_page(INDEX_PAGE, {
+        "main_time": main_time["time"],
+        "main_location": escape(f"{main_city}, {main_time['country']}"),
+        "main_date": main_time["date"],
+        "sunrise": main_time["sunrise_sunset"]["sunrise"],
+        "sunset": main_time["sunrise_sunset"]["sunset"],
+        "daylight": main_time["sunrise_sunset"]["duration"],
+        "city_cards": city_cards,
+        "bootstrap": json.dumps({"mainCity": main_city, "cities": featured_cities}).replace("</", "<\\/"),
+    })
+
+def encode_json(data):
+    """Response body bytes, encoded like jsonify() outside debug mode"""
+    return (current_app.json.dumps(data, separators=(",", ":")) + "\n").encode()
+
+def resolve_instants(queries):
+    """Epoch seconds for (city, at) pairs, where at is anything parse_instant() takes.
+
+    Wall-clock times are in the city's own zone. Returns the instants and
+    an error message per pair (None where it parsed).
     """
-    return html_content
+    instants = np.zeros(len(queries))
+    errors = [None] * len(queries)
+    wall_rows = {}
+    zone_of = {}
+    for i, (city, at) in enumerate(queries):
+        try:
+            instants[i], is_wall = parse_instant(at)
+        except (TypeError, ValueError) as e:
+            errors[i] = str(e)
+            continue
+        if is_wall:
+            if city not in zone_of:
+                zone_of[city] = WORLD_CITIES[city]["timezone"]
+            wall_rows.setdefault(zone_of[city], []).append(i)
+    for zone_name, rows in wall_rows.items():
+        instants[rows] = zones.local_to_utc(zones.get_zone(zone_name), instants[rows])
+        # Wall times at either end of the calendar can land past it in UTC
+        for row in rows:
+            if not MIN_TS <= instants[row] <= MAX_TS:
+                errors[row] = "ts is out of range"
+    return instants, errors
+
+def get_times_at(cities, instants, epoch=False):
+    """Time information for each city at its own epoch instant, with the
+    instant itself as "epoch" too if asked.
+
+    One vectorized transition-table lookup per zone gives every offset; sun
+    times come from the calendar for each city's local date.
+    """
+    instants = np.asarray(instants, dtype=np.float64)
+    offsets = np.zeros(len(cities), dtype=np.int64)
+    abbreviations = [None] * len(cities)
+    # Registry records are looked up once per distinct city
+    records = {city: WORLD_CITIES[city] for city in set(cities)}
+    rows_by_zone = {}
+    for i, city in enumerate(cities):
+        rows_by_zone.setdefault(records[city]["timezone"], []).append(i)
+    for zone_name, rows in rows_by_zone.items():
+        table = zones.get_zone(zone_name)
+        offsets[rows] = table.offsets_at(instants[rows])
+        for row, index in zip(rows, table.indexes_at(instants[rows]).tolist()):
+            abbreviations[row] = table.abbreviations[index]
+    
+    local_seconds = (np.floor(instants).astype(np.int64) + offsets).tolist()
+    sun_times = sun_calendar.get_many([(city, seconds // 86400) for city, seconds in zip(cities, local_seconds)])
+    
+    results = []
+    for i, city in enumerate(cities):
+        tm = time.gmtime(local_seconds[i])
+        offset = int(offsets[i])
+        instant = float(instants[i])
+        results.append({
+            "at": datetime.fromtimestamp(instant, timezone.utc).isoformat(),
+            "time": time.strftime("%H:%M:%S", tm),
+            "date": time.strftime("%A, %b %d %Y", tm),
+            "timezone": abbreviations[i] + zones.format_offset(offset),
+            "utc_offset": zones.format_offset(offset),
+            "offset": offset,
+            "time_of_day": get_time_of_day(tm.tm_hour),
+            "sunrise_sunset": sun_times[i],
+            "country": records[city]["country"]
+        })
+        if epoch:
+            results[-1]["epoch"] = instant
+    return results
 
-@app.route('/api/time/<city>')
+# Fields of a time record that ?fields= can select from. "at", "epoch" and
+# "offset" (seconds east of UTC) are only included when asked for, except
+# with ?at=, whose records have always carried "at" and "offset".
+TIME_FIELDS = ("at", "country", "date", "epoch", "offset", "sunrise_sunset", "time", "time_of_day",
+               "timezone", "utc_offset")
+
+def parse_time_fields():
+    """(fields, None) from ?fields= (None without it), or (None, error response)"""
+    if "fields" not in request.args:
+        return None, None
+    fields = list(dict.fromkeys(f.strip() for f in request.args["fields"].split(",") if f.strip()))
+    unknown = set(fields) - set(TIME_FIELDS)
+    if unknown or not fields:
+        return None, (jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields given",
+                               "fields": TIME_FIELDS}), 400)
+    return fields, None
+
+def time_response(data, fields, mimetype):
+    """data projected to fields (keeping "city" and "error"), in the negotiated encoding"""
+    if fields is not None:
+        def project(record):
+            return {key: record[key] for key in (*fields, "city", "error") if key in record}
+        data = {"results": [project(r) for r in data["results"]]} if "results" in data else project(data)
+    if mimetype is None:
+        response = jsonify(data)
+    else:
+        response = Response(formats.ENCODERS[mimetype](data), mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+@bp.route('/api/time', methods=['POST'])
+def get_times_at_api():
+    fields, error = parse_time_fields()
+    if error is not None:
+        return error
+    payload = request.get_json(silent=True)
+    queries = payload.get("queries") if isinstance(payload, dict) else None
+    if not isinstance(queries, list) or len(queries) > MAX_TIME_QUERIES:
+        return jsonify({"error": f"queries must be a list of up to {MAX_TIME_QUERIES} {{\"city\", \"at\"}} objects"}), 400
+    
+    results = [None] * len(queries)
+    valid = []
+    known = {}
+    for i, query in enumerate(queries):
+        city = query.get("city") if isinstance(query, dict) else None
+        if isinstance(city, str) and city not in known:
+            known[city] = city in WORLD_CITIES
+        if not (isinstance(city, str) and known[city]):
+            results[i] = {"error": f"City not found: {city}"}
+        else:
+            valid.append(i)
+    
+    pairs = [(queries[i]["city"], queries[i].get("at", time.time())) for i in valid]
+    instants, errors = resolve_instants(pairs)
+    ok = [j for j, error in enumerate(errors) if error is None]
+    times = get_times_at([pairs[j][0] for j in ok], instants[ok], epoch=fields is not None)
+    for j, error in enumerate(errors):
+        if error is not None:
+            results[valid[j]] = {"city": pairs[j][0], "error": error}
+    for j, data in zip(ok, times):
+        results[valid[j]] = dict(data, city=pairs[j][0])
+    
+    return time_response({"results": results}, fields, formats.negotiate(request.accept_mimetypes))
+
+@bp.route('/api/time/<city>')
 def get_time_api(city):
-    time_data = get_city_time(city)
-    if not time_data:
+    if city not in WORLD_CITIES:
         return jsonify({"error": "City not found"}), 404
+    fields, error = parse_time_fields()
+    if error is not None:
+        return error
+    mimetype = formats.negotiate(request.accept_mimetypes)
+    
+    if "at" in request.args:
+        at = request.args["at"]
+        # Plain numbers are epoch seconds, anything else ISO-8601
+        if re.fullmatch(r"-?\d+(\.\d+)?", at):
+            at = float(at)
+        instants, errors = resolve_instants([(city, at)])
+        if errors[0] is not None:
+            return jsonify({"error": f"at: {errors[0]}"}), 400
+        return time_response(get_times_at([city], instants, epoch=fields is not None)[0], fields, mimetype)
+    
+    # The payload only changes once per wall-clock second, so every caller
+    # within the same second shares one computed, serialized snapshot.
+    second = int(time.time())
+    
+    def compute():
+        now = get_city_now(city, second)
+        time_data = get_city_time(city, now)
+        time_data["time_of_day"] = get_time_of_day(now.hour)
+        time_data["sunrise_sunset"] = get_sunrise_sunset(city, now)
+        time_data["country"] = WORLD_CITIES[city]["country"]
+        return second, now.offset, time_data
+    
+    # A profiled request computes its own snapshot, so its stages are measured
+    profiled = profiler.active()
+    published = None if profiled else ticker.snapshot(second)
+    if fields is not None or mimetype is not None:
+        # Projected or binary responses skip the shared JSON bodies
+        epoch, offset, data = published.read(city) if published is not None else compute()
+        if fields is not None:
+            data.update(at=datetime.fromtimestamp(epoch, timezone.utc).isoformat(), epoch=epoch, offset=offset)
+        return time_response(data, fields, mimetype)
+    
+    if profiled:
+        body = encode_json(compute()[2])
+    elif published is not None:
+        body = encode_json(published.time_data(city))
+    else:
+        body = snapshot_cache.get_or_compute((city, second), lambda: encode_json(compute()[2]))
+    response = Response(body, mimetype="application/json")
+    response.vary.add("Accept")
+    return response
+
+def parse_city_list(values):
+    """Flatten repeated and comma-separated city arguments, keeping order"""
+    cities = []
+    for value in values:
+        cities.extend(name.strip() for name in value.split(",") if name.strip())
+    if not cities or cities == ["all"]:
+        return list(WORLD_CITIES)
+    return list(dict.fromkeys(cities))
+
+@bp.route('/api/times', methods=['GET', 'POST'])
+def get_times_api():
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        cities = payload.get("cities", "all") if isinstance(payload, dict) else None
+        if isinstance(cities, str):
+            cities = [cities]
+        if not isinstance(cities, list) or not cities or not all(isinstance(c, str) for c in cities):
+            return jsonify({"error": "cities must be a list of city names"}), 400
+    else:
+        cities = request.args.getlist("cities")
+    
+    ts = time.time()
+    cities = parse_city_list(cities)
+    times = get_times_now(cities, ts)
+    not_found = [city for city in cities if city not in times]
+    
+    return jsonify({
+        "utc": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        "cities": times,
+        "not_found": not_found
+    })
+
+def get_offsets_for(cities, ts):
+    """Current UTC offset and next offset change for each known city at one instant"""
+    by_zone = {}
+    offsets = {}
+    for city in cities:
+        if city not in WORLD_CITIES:
+            continue
+        record = WORLD_CITIES[city]
+        zone_data = by_zone.get(record["timezone"])
+        if zone_data is None:
+            table = zones.get_zone(record["timezone"])
+            i = table.index(ts)
+            upcoming = table.next_transition(ts)
+            zone_data = by_zone[record["timezone"]] = {
+                "timezone": record["timezone"],
+                "offset": table.offsets[i],
+                "abbreviation": table.abbreviations[i],
+                "next_transition": None if upcoming is None else {
+                    "at": upcoming[0],
+                    "offset": upcoming[1],
+                    "abbreviation": upcoming[2]
+                }
+            }
+        offsets[city] = dict(zone_data, country=record["country"])
+    return offsets
+
+@bp.route('/api/offsets')
+def get_offsets_api():
+    ts = time.time()
+    cities = parse_city_list(request.args.getlist("cities"))
+    offsets = get_offsets_for(cities, ts)
     
-    timezone = pytz.timezone(WORLD_CITIES[city]["timezone"])
-    now = datetime.now(timezone)
-    time_data["time_of_day"] = get_time_of_day(now.hour)
-    time_data["sunrise_sunset"] = get_sunrise_sunset(city)
-    time_data["country"] = WORLD_CITIES[city]["country"]
+    # The schedule stays valid until the first of its transitions; clocks
+    # resync a second after it, or after OFFSET_RESYNC_SECONDS regardless
+    upcoming = [o["next_transition"]["at"] for o in offsets.values() if o["next_transition"]]
+    resync_after = OFFSET_RESYNC_SECONDS
+    if upcoming:
+        resync_after = max(1, min(resync_after, int(min(upcoming) - ts) + 1))
     
-    return jsonify(time_data)
+    response = jsonify({
+        "server_time": ts,
+        "resync_after": resync_after,
+        "cities": offsets,
+        "not_found": [city for city in cities if city not in offsets]
+    })
+    response.headers["Cache-Control"] = "no-store"
+    return response
 
-@app.route('/api/cities')
+@bp.route('/api/stream')
+def stream_times_api():
+    cities = [city for city in parse_city_list(request.args.getlist("cities")) if city in WORLD_CITIES]
+    if not cities:
+        return jsonify({"error": "No known cities requested"}), 404
+    # "second" pushes every displayed-second change, "minute" only HH:MM changes
+    key_length = -3 if request.args.get("resolution") == "minute" else None
+    
+    def events():
+        broadcaster.subscribe(cities)
+        try:
+            yield "retry: 2000\n\n"
+            seq = 0
+            last_sent = {}
+            while True:
+                tick = broadcaster.wait(seq, timeout=15)
+                if tick is None:
+                    yield ": keepalive\n\n"
+                    continue
+                seq, encoded = tick
+                changed = []
+                for city in cities:
+                    if city not in encoded:
+                        continue
+                    display, payload = encoded[city]
+                    display = display[:key_length]
+                    if last_sent.get(city) != display:
+                        last_sent[city] = display
+                        changed.append(f"{json.dumps(city)}:{payload}")
+                if changed:
+                    yield "data: {" + ",".join(changed) + "}\n\n"
+        finally:
+            broadcaster.unsubscribe(cities)
+    
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@bp.route('/api/search')
+def search_api():
+    query = request.args.get("q", "")
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    results = [
+        dict(WORLD_CITIES.record(index), city=WORLD_CITIES.name_at(index))
+        for index in search_index.search(query, limit)
+    ]
+    return jsonify({"query": query, "results": results})
+
+def valid_coordinate(lat, lon):
+    return (
+        all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lon))
+        and -90 <= lat <= 90 and -180 <= lon <= 180
+    )
+
+def nearest_cities(points, k):
+    """Nearest k cities, with their current time, for each (lat, lon) point"""
+    matches = [geo_index.nearest(lat, lon, k) for lat, lon in points]
+    names = {int(index): WORLD_CITIES.name_at(int(index)) for indexes, _ in matches for index in indexes}
+    # One clock read and one localization per zone for the whole batch
+    times = get_times_for(list(dict.fromkeys(names.values())), time.time())
+    return [
+        {
+            "lat": lat,
+            "lon": lon,
+            "cities": [
+                dict(times[names[int(index)]], city=names[int(index)], distance_km=round(float(distance), 3))
+                for index, distance in zip(indexes, distances)
+            ]
+        }
+        for (lat, lon), (indexes, distances) in zip(points, matches)
+    ]
+
+@bp.route('/api/nearest', methods=['GET', 'POST'])
+def nearest_api():
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            payload = {}
+        points = payload.get("points")
+        k = payload.get("k", 1)
+        if (
+            not isinstance(points, list) or len(points) > MAX_NEAREST_POINTS
+            or not all(isinstance(p, list) and len(p) == 2 and valid_coordinate(*p) for p in points)
+        ):
+            return jsonify({"error": f"points must be a list of up to {MAX_NEAREST_POINTS} [lat, lon] pairs"}), 400
+        if not isinstance(k, int):
+            return jsonify({"error": "k must be an integer"}), 400
+        return jsonify({"results": nearest_cities(points, min(max(k, 1), 50))})
+    
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    if not valid_coordinate(lat, lon):
+        return jsonify({"error": "lat and lon must be valid coordinates"}), 400
+    k = min(max(request.args.get("k", 1, type=int), 1), 50)
+    return jsonify(nearest_cities([(lat, lon)], k)[0])
+
+@lru_cache(maxsize=4096)
+def resolve_zone(name):
+    """IANA timezone for a zone name or a city name, or None"""
+    if not isinstance(name, str):
+        return None
+    if zones.is_zone(name):
+        return name
+    if name in WORLD_CITIES:
+        return WORLD_CITIES[name]["timezone"]
+    return None
+
+@bp.route('/api/convert', methods=['POST'])
+def convert_api():
+    # NDJSON bodies are read and answered incrementally, a batch at a time,
+    # so neither side of a large conversion is held in memory at once
+    if request.mimetype in ("application/x-ndjson", "application/jsonlines"):
+        records = read_ndjson(request.stream)
+    else:
+        payload = request.get_json(silent=True)
+        records = payload.get("records") if isinstance(payload, dict) else payload
+        if not isinstance(records, list):
+            return jsonify({"error": "Expected a JSON array of records or an NDJSON body"}), 400
+    
+    return Response(
+        stream_with_context(convert_stream(records, resolve_zone)),
+        mimetype="application/x-ndjson"
+    )
+
+def parse_clock(value):
+    """Seconds after midnight for an HH:MM string"""
+    hours, minutes = (int(part) for part in value.split(":"))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60 and hours * 60 + minutes <= 1440):
+        raise ValueError(value)
+    return (hours * 60 + minutes) * 60
+
+def parse_day(value):
+    """Days since 1970-01-01 for a YYYY-MM-DD string"""
+    return (datetime.strptime(value, "%Y-%m-%d") - datetime(1970, 1, 1)).days
+
+def format_day(day):
+    return time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+
+# Dates that from/to may name: the zone tables run out after LAST_RULE_YEAR,
+# and the results must stay inside years that format as YYYY
+FIRST_DAY = parse_day("1900-01-01")
+LAST_DAY = parse_day(f"{zones.LAST_RULE_YEAR}-12-31")
+DAY_RANGE_ERROR = f"from and to must be between {format_day(FIRST_DAY)} and {format_day(LAST_DAY)}"
+
+@bp.route('/api/overlap')
+def overlap_api():
+    names = parse_city_list(request.args.getlist("cities"))
+    cities = [city for city in names if city in WORLD_CITIES]
+    today = int(time.time() // 86400)
+    try:
+        start = parse_clock(request.args.get("start", "09:00"))
+        end = parse_clock(request.args.get("end", "17:00"))
+        first_day = parse_day(request.args["from"]) if "from" in request.args else today
+        last_day = parse_day(request.args["to"]) if "to" in request.args else first_day + 6
+    except ValueError:
+        return jsonify({"error": "start/end must be HH:MM and from/to YYYY-MM-DD"}), 400
+    if not FIRST_DAY <= first_day <= LAST_DAY or not FIRST_DAY <= last_day <= LAST_DAY:
+        return jsonify({"error": DAY_RANGE_ERROR}), 400
+    if not 0 <= last_day - first_day < MAX_OVERLAP_DAYS:
+        return jsonify({"error": f"to must be on or after from and span at most {MAX_OVERLAP_DAYS} days"}), 400
+    if not 0 < len(cities) <= MAX_OVERLAP_CITIES:
+        return jsonify({"error": f"Request between 1 and {MAX_OVERLAP_CITIES} known cities"}), 400
+    
+    zone_names = {city: WORLD_CITIES[city]["timezone"] for city in cities}
+    starts, ends = overlaps(
+        zone_names.values(), first_day, last_day, start, end,
+        weekdays_only=request.args.get("weekdays") in ("1", "true")
+    )
+    
+    # Local start/end of every overlap for each city, one vectorized lookup per zone
+    local = {}
+    for city, zone_name in zone_names.items():
+        table = zones.get_zone(zone_name)
+        local[city] = (starts + table.offsets_at(starts), ends + table.offsets_at(ends))
+    
+    results = []
+    for i in range(len(starts)):
+        by_city = {}
+        for city in cities:
+            local_start = time.gmtime(int(local[city][0][i]))
+            by_city[city] = {
+                "date": time.strftime("%Y-%m-%d", local_start),
+                "start": time.strftime("%H:%M", local_start),
+                "end": time.strftime("%H:%M", time.gmtime(int(local[city][1][i]))),
+                "time_of_day": get_time_of_day(local_start.tm_hour)
+            }
+        results.append({
+            "start": datetime.fromtimestamp(int(starts[i]), timezone.utc).isoformat(),
+            "end": datetime.fromtimestamp(int(ends[i]), timezone.utc).isoformat(),
+            "minutes": int(ends[i] - starts[i]) // 60,
+            "local": by_city
+        })
+    
+    return jsonify({
+        "from": format_day(first_day),
+        "to": format_day(last_day),
+        "window": {"start": request.args.get("start", "09:00"), "end": request.args.get("end", "17:00")},
+        "cities": cities,
+        "not_found": [city for city in names if city not in WORLD_CITIES],
+        "overlaps": results,
+        "total_minutes": int((ends - starts).sum()) // 60
+    })
+
+@bp.route('/api/transitions')
+def transitions_api():
+    today = int(time.time() // 86400)
+    try:
+        first_day = parse_day(request.args["from"]) if "from" in request.args else today
+        last_day = parse_day(request.args["to"]) if "to" in request.args else first_day + 89
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    if not FIRST_DAY <= first_day <= LAST_DAY or not FIRST_DAY <= last_day <= LAST_DAY:
+        return jsonify({"error": DAY_RANGE_ERROR}), 400
+    if not 0 <= last_day - first_day < MAX_TRANSITION_DAYS:
+        return jsonify({"error": f"to must be on or after from and span at most {MAX_TRANSITION_DAYS} days"}), 400
+    
+    if request.args.getlist("cities"):
+        names = parse_city_list(request.args.getlist("cities"))
+        cities_by_zone = {}
+        for city in names:
+            if city in WORLD_CITIES:
+                cities_by_zone.setdefault(WORLD_CITIES[city]["timezone"], []).append(city)
+        not_found = [city for city in names if city not in WORLD_CITIES]
+    else:
+        cities_by_zone, not_found = zone_cities, []
+    
+    results = []
+    for instant, zone_name, before, after, abbreviation in transition_calendar.between(
+            first_day * 86400, (last_day + 1) * 86400):
+        if zone_name not in cities_by_zone:
+            continue
+        results.append({
+            "at": datetime.fromtimestamp(instant, timezone.utc).isoformat(),
+            "ts": instant,
+            "timezone": zone_name,
+            "from_offset": zones.format_offset(before),
+            "to_offset": zones.format_offset(after),
+            "abbreviation": abbreviation,
+            "cities": cities_by_zone[zone_name]
+        })
+    
+    return jsonify({
+        "from": format_day(first_day),
+        "to": format_day(last_day),
+        "transitions": results,
+        "not_found": not_found
+    })
+
+def dashboard_json(dashboard):
+    return {"main_city": dashboard.main_city, "cities": dashboard.cities, "version": dashboard.version}
+
+@bp.route('/api/dashboard', methods=['GET'])
+def get_dashboard_api():
+    user_id, version, dashboard = load_dashboard()
+    response = jsonify(dashboard_json(dashboard))
+    response.vary.add("Cookie")
+    sync_dashboard_cookie(response, user_id, version, dashboard)
+    return response
+
+@bp.route('/api/dashboard', methods=['PUT'])
+def save_dashboard_api():
+    payload = request.get_json(silent=True)
+    cities = payload.get("cities") if isinstance(payload, dict) else None
+    if (not isinstance(cities, list) or not 1 <= len(cities) <= MAX_DASHBOARD_CITIES
+            or not all(isinstance(city, str) for city in cities)):
+        return jsonify({"error": f"cities must be a list of 1 to {MAX_DASHBOARD_CITIES} city names"}), 400
+    cities = list(dict.fromkeys(cities))
+    main_city = payload.get("main_city", cities[0])
+    if not isinstance(main_city, str):
+        return jsonify({"error": "main_city must be a city name"}), 400
+    unknown = [city for city in dict.fromkeys([main_city] + cities) if city not in WORLD_CITIES]
+    if unknown:
+        return jsonify({"error": f"Unknown cities: {', '.join(unknown)}"}), 400
+    
+    user_id, _version = parse_cookie(request.cookies.get(DASHBOARD_COOKIE))
+    if user_id is None:
+        user_id = new_user_id()
+    dashboard = dashboard_store.save(user_id, main_city, cities)
+    response = jsonify(dashboard_json(dashboard))
+    sync_dashboard_cookie(response, user_id, None, dashboard)
+    return response
+
+@bp.route('/api/stats')
+def get_stats_api():
+    return jsonify({"caches": [snapshot_cache.stats(), sun_calendar.memo.stats(), city_pages.stats(),
+                               dashboard_store.cache.stats()]})
+
+# The city table never changes while the process runs: it is serialized
+# once, and every page or projection of it is joined from those bytes
+city_fragments = JSONObjectFragments(dict(WORLD_CITIES.items()))
+cities_payload = Payload(city_fragments.encode())
+city_pages = LRUCache(maxsize=256, name="city_pages")
+
+@bp.route('/api/cities')
 def get_cities():
-    return jsonify(WORLD_CITIES)
+    if not request.args.keys() & {"offset", "limit", "fields"}:
+        return cities_payload.response(request)
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", len(city_fragments)))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    if offset < 0 or limit < 0:
+        return jsonify({"error": "offset and limit must not be negative"}), 400
+
+    fields = None
+    if "fields" in request.args:
+        fields = tuple(sorted({f.strip() for f in request.args["fields"].split(",") if f.strip()}))
+        unknown = set(fields) - set(city_fragments.fields)
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}",
+                            "fields": city_fragments.fields}), 400
+
+    offset = min(offset, len(city_fragments))
+    limit = min(limit, len(city_fragments) - offset)
+    payload = city_pages.get_or_compute(
+        (offset, limit, fields),
+        lambda: Payload(city_fragments.encode(offset, offset + limit, fields))
+    )
+    return payload.response(request, {"X-Total-Count": str(len(city_fragments))})
+
+metrics = Metrics()
+for cache in (snapshot_cache, sun_calendar.memo, city_pages, dashboard_store.cache):
+    metrics.register_cache(cache)
+metrics.register_cache(resolve_zone, "resolve_zone")
+metrics.register_cache(zones.format_offset, "format_offset")
+
+@bp.route('/metrics')
+def metrics_api():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Opt-in Server-Timing breakdowns; the stage functions are only wrapped when
+# TIMESPOT_PROFILE_TOKEN is set
+profiler = Profiler()
+profiler.instrument(
+    globals(),
+    zone="get_city_now",
+    format="get_city_time",
+    sun="get_sunrise_sunset",
+    render="render_index",
+    serialize="encode_json",
+)
+
+# Per-client rate limits on /api/ routes and caps on concurrent requests and
+# open streams (TIMESPOT_RATE_LIMITS, TIMESPOT_MAX_CONCURRENT,
+# TIMESPOT_MAX_STREAMS). Refused requests never reach Flask, so the request
+# metrics count them separately.
+admission = Admission()
+metrics.register_counter("admission_refused", "Requests refused before routing, by reason.", "reason",
+                         lambda: dict(admission.refused))
+
+def warm_up(app):
+    """Run every hot path once so worker processes forked afterwards start warm"""
+    client = app.test_client()
+    with admission.suspended():
+        for path in ("/", "/api/cities", "/api/times?cities=all", "/api/search?q=lon", "/api/nearest?lat=0&lon=0"):
+            client.get(path)
+        for city in list(WORLD_CITIES)[:FEATURED_WARM_UP]:
+            client.get(f"/api/time/{city}")
+    snapshot_cache.clear()
+    # Workers start their own ticker threads; the master needs none
+    ticker.stop()
+    
+    # Move everything built so far out of the collector's reach: a GC pass
+    # in a worker would otherwise write to (and un-share) every object page
+    gc.collect()
+    gc.freeze()
+
+def create_app(warm=False):
+    """Application factory; warm=True in a pre-forking server's master process"""
+    app = Flask(__name__)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    app.register_blueprint(bp)
+    admission.init_app(app)
+    # Behind a proxy every connection comes from the proxy; take the client
+    # address from the X-Forwarded-For entries the trusted hops appended, so
+    # that the rate limits are per visitor
+    proxy_hops = int(os.environ.get("TIMESPOT_PROXY_HOPS", "0"))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
+    if warm:
+        warm_up(app)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=80, debug=False)
@@ -0,0 +1,63 @@
+"""Throughput benchmark for /api/convert and the batch converter behind it.
+
+    python benchmarks/convert_bench.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WORLD_CITIES, app, resolve_zone  # noqa: E402
+from convert import convert_stream  # noqa: E402
+
+
+def make_records(rows, seed=0):
+    rng = random.Random(seed)
+    targets = list(WORLD_CITIES) + ["UTC", "Europe/Berlin", "America/Chicago"]
+    records = []
+    for _ in range(rows):
+        if rng.random() < 0.5:
+            records.append({"ts": rng.randint(0, 2_000_000_000), "to": rng.choice(targets)})
+        else:
+            wall = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(rng.randint(0, 2_000_000_000)))
+            records.append({"ts": wall, "from": rng.choice(targets), "to": rng.choice(targets)})
+    return records
+
+
+def run(label, rows, fn):
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>9} rows  {elapsed:7.2f} s  {rows / elapsed:>10,.0f} rows/s  {size / 1e6:7.1f} MB out")
+    return {"label": label, "rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    records = make_records(args.rows)
+    ndjson = "".join(json.dumps(record) + "\n" for record in records).encode()
+    client = app.test_client()
+
+    results = [
+        run("convert_stream (in-process)", args.rows,
+            lambda: sum(len(chunk) for chunk in convert_stream(records, resolve_zone))),
+        run("POST /api/convert (NDJSON)", args.rows,
+            lambda: len(client.post("/api/convert", data=ndjson, content_type="application/x-ndjson").data)),
+        run("POST /api/convert (JSON)", args.rows,
+            lambda: len(client.post("/api/convert", json=records).data)),
+    ]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""HTTP load generator for a running server (dev server or gunicorn).
+
+    python benchmarks/http_load.py --url http://127.0.0.1:8000 --clients 32 --seconds 10
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+PATHS = [
+    "/api/time/London",
+    "/api/time/" + quote("São Paulo"),
+    "/api/times?cities=all",
+    "/api/search?q=san",
+    "/api/nearest?lat=48.1&lon=11.5&k=3",
+    "/",
+]
+
+
+def client(host, port, paths, deadline, latencies, errors):
+    """One keep-alive connection issuing requests back to back until deadline"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append("connection")
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(url, clients, seconds, paths=PATHS):
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(parts.hostname, parts.port or 80, paths, deadline, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "url": url,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", action="append", help="request only these paths (repeatable)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    result = run(args.url, args.clients, args.seconds, args.path or PATHS)
+    print(f"{result['requests']:>8} requests  {result['errors']} errors  {result['rps']:>8,.0f} req/s  "
+          f"p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Latency of well-behaved clients while other clients overload the server.
+
+    python benchmarks/overload.py --seconds 10
+
+Each scenario runs a threaded server in a fresh process, with admission
+control configured through TIMESPOT_RATE_LIMITS and TIMESPOT_MAX_CONCURRENT.
+A few paced clients on 127.0.0.1 stay within the rate limit. In the overload
+scenarios, abusive clients on 127.0.0.2, in a process of their own, send
+requests back to back. Exits non-zero when, under overload with admission
+control on, any paced request is refused or the paced clients' p99 exceeds
+--max-p99-ms or is no better than with admission control off.
+
+On a machine with fewer cores than processes in play, the abusive clients
+take CPU time from the server directly, which no server-side limit can
+give back; the gate's default bound allows for a single core.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import DEFAULT_LIMITS, DEFAULT_MAX_CONCURRENT  # noqa: E402
+from http_load import percentile  # noqa: E402
+
+PACED_PATHS = ["/api/time/London", "/api/time/Tokyo", "/api/times?cities=London,Tokyo", "/api/search?q=par"]
+ABUSIVE_PATHS = ["/api/time/London", "/api/times?cities=all", "/api/cities"]
+
+SCENARIOS = {
+    "baseline": {"limits": "off", "max_concurrent": "0", "abusers": False},
+    "overload, admission off": {"limits": "off", "max_concurrent": "0", "abusers": True},
+    # The shipped defaults, as a gunicorn worker with GUNICORN_THREADS threads gets them
+    "overload, admission on": {"limits": DEFAULT_LIMITS, "max_concurrent": str(DEFAULT_MAX_CONCURRENT), "abusers": True},
+}
+
+
+def paced(port, paths, interval, deadline, latencies, statuses):
+    """Keep-alive client sending one request every interval seconds"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=("127.0.0.1", 0))
+    i = 0
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        time.sleep(max(0, next_at - time.perf_counter()))
+        start = time.perf_counter()
+        conn.request("GET", paths[i % len(paths)])
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] += 1
+        i += 1
+        next_at += interval
+    conn.close()
+
+
+def abusive(port, paths, deadline, statuses):
+    """Keep-alive client sending requests back to back, ignoring Retry-After"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=("127.0.0.2", 0))
+    i = 0
+    while time.perf_counter() < deadline:
+        try:
+            conn.request("GET", paths[i % len(paths)])
+            response = conn.getresponse()
+            response.read()
+            statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            statuses["connection"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=("127.0.0.2", 0))
+        i += 1
+    conn.close()
+
+
+def serve():
+    """Child process: serve the app on a free port, printed first, until killed"""
+    from werkzeug.serving import make_server
+    sys.path.insert(0, ROOT)
+    import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def abuse(port, abusers, seconds):
+    """Child process: abusive clients, in their own interpreter so they do not
+    compete with the paced clients for a GIL"""
+    statuses = Counter()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=abusive, args=(port, ABUSIVE_PATHS, deadline, statuses)) for _ in range(abusers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({str(status): count for status, count in sorted(statuses.items(), key=str)}))
+
+
+def measure(config, args):
+    env = dict(os.environ, TIMESPOT_RATE_LIMITS=config["limits"], TIMESPOT_MAX_CONCURRENT=config["max_concurrent"])
+    script = os.path.abspath(__file__)
+    server = subprocess.Popen([sys.executable, script, "--serve"], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline())
+        abusers = None
+        if config["abusers"]:
+            abusers = subprocess.Popen([sys.executable, script, "--abuse", str(port), str(args.abusers), str(args.seconds)],
+                                       cwd=ROOT, stdout=subprocess.PIPE, text=True)
+            time.sleep(0.5)  # let the abusers connect and saturate the server
+
+        latencies, statuses = [], Counter()
+        deadline = time.perf_counter() + args.seconds - (0.5 if abusers else 0)
+        threads = [threading.Thread(target=paced, args=(port, PACED_PATHS, 1 / args.rate, deadline, latencies, statuses))
+                   for _ in range(args.paced)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        abusive_statuses = json.loads(abusers.communicate()[0].strip().splitlines()[-1]) if abusers else {}
+    finally:
+        server.kill()
+        server.wait()
+
+    latencies.sort()
+    return {
+        "paced_requests": len(latencies),
+        "paced_p50_ms": percentile(latencies, 0.50) * 1000,
+        "paced_p99_ms": percentile(latencies, 0.99) * 1000,
+        "paced_max_ms": latencies[-1] * 1000,
+        "paced_refused": sum(count for status, count in statuses.items() if status != 200),
+        "abusive_statuses": abusive_statuses,
+    }
+
+
+def main():
+    if sys.argv[1:2] == ["--serve"]:
+        return serve()
+    if sys.argv[1:2] == ["--abuse"]:
+        port, abusers, seconds = sys.argv[2:]
+        return abuse(int(port), int(abusers), float(seconds))
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paced", type=int, default=4, help="well-behaved clients")
+    parser.add_argument("--rate", type=float, default=5, help="requests per second per well-behaved client")
+    parser.add_argument("--abusers", type=int, default=32, help="clients sending back to back")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--max-p99-ms", type=float, default=100)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, config in SCENARIOS.items():
+        result = results[name] = measure(config, args)
+        print(f"{name:<24} paced p50 {result['paced_p50_ms']:6.1f} ms  p99 {result['paced_p99_ms']:7.1f} ms  "
+              f"max {result['paced_max_ms']:7.1f} ms  refused {result['paced_refused']}  "
+              f"abusive {result['abusive_statuses']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    guarded, unguarded = results["overload, admission on"], results["overload, admission off"]
+    if (guarded["paced_refused"] or guarded["paced_p99_ms"] > args.max_p99_ms
+            or guarded["paced_p99_ms"] >= unguarded["paced_p99_ms"]):
+        print(f"FAIL: with admission control on, paced p99 is {guarded['paced_p99_ms']:.1f} ms "
+              f"(limit {args.max_p99_ms:g} ms, {unguarded['paced_p99_ms']:.1f} ms with it off) and "
+              f"{guarded['paced_refused']} paced requests were refused")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
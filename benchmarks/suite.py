@@ -0,0 +1,128 @@
+"""Microbenchmarks of the time helpers and in-process load tests of the hot endpoints.
+
+    python benchmarks/suite.py --json results.json
+    python benchmarks/suite.py --compare results.json --threshold 15
+
+With --compare, exits non-zero when any microbenchmark, or the throughput or
+median latency of any load test, is more than --threshold percent worse than
+in the saved results.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every load test client shares one address; rate limits would measure the limiter
+os.environ.setdefault("TIMESPOT_RATE_LIMITS", "off")
+os.environ.setdefault("TIMESPOT_MAX_CONCURRENT", "0")
+
+from werkzeug.serving import make_server  # noqa: E402
+
+import app  # noqa: E402
+import http_load  # noqa: E402
+
+MICRO_CITY = "London"
+
+LOAD_TESTS = {
+    "index": ["/"],
+    "time": ["/api/time/London", "/api/time/Tokyo", "/api/time/New%20York"],
+    "cities": ["/api/cities"],
+}
+
+# Metrics checked by --compare, and whether a larger value is the better one.
+# Tail latencies are recorded but too noisy on shared machines to gate on.
+METRICS = {"ns_per_op": False, "rps": True, "p50_ms": False}
+
+
+def micro(name, fn, repeat=5):
+    """Best-of-repeat nanoseconds per call, timing at least 0.2 s of calls per repeat"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+    print(f"{name:<32} {best * 1e9:>12,.0f} ns/op")
+    return {"ns_per_op": best * 1e9}
+
+
+def micro_benchmarks():
+    now = app.get_city_now(MICRO_CITY)
+    return {
+        "micro/get_city_now": micro("get_city_now", lambda: app.get_city_now(MICRO_CITY)),
+        "micro/get_city_time": micro("get_city_time", lambda: app.get_city_time(MICRO_CITY, now)),
+        "micro/get_time_of_day": micro("get_time_of_day", lambda: app.get_time_of_day(now.hour)),
+        "micro/get_sunrise_sunset": micro("get_sunrise_sunset", lambda: app.get_sunrise_sunset(MICRO_CITY, now)),
+    }
+
+
+def load_tests(clients, seconds):
+    """Each LOAD_TESTS entry against a threaded server running in this process"""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    results = {}
+    try:
+        for name, paths in LOAD_TESTS.items():
+            http_load.run(url, clients, min(seconds, 1), paths)  # warm up connections and caches
+            result = http_load.run(url, clients, seconds, paths)
+            print(f"{'load/' + name:<32} {result['rps']:>8,.0f} req/s  p50 {result['p50_ms']:.1f} ms  "
+                  f"p95 {result['p95_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms  {result['errors']} errors")
+            results[f"load/{name}"] = {key: result[key] for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "errors")}
+    finally:
+        server.shutdown()
+    return results
+
+
+def regressions(baseline, current, threshold):
+    """(benchmark, metric, old, new, percent worse) for everything worse than threshold percent"""
+    found = []
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if metric not in METRICS or not old or value is None:
+                continue
+            worse = (old - value) / old * 100 if METRICS[metric] else (value - old) / old * 100
+            if worse > threshold:
+                found.append((name, metric, old, value, worse))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--skip-load", action="store_true", help="run only the microbenchmarks")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=10, help="allowed slowdown, in percent")
+    args = parser.parse_args()
+
+    results = {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                        "cpus": os.cpu_count(), "clients": args.clients, "seconds": args.seconds}}
+    results.update(micro_benchmarks())
+    if not args.skip_load:
+        results.update(load_tests(args.clients, args.seconds))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(baseline, results, args.threshold)
+        for name, metric, old, new, worse in found:
+            print(f"REGRESSION {name} {metric}: {old:,.2f} -> {new:,.2f} ({worse:.1f}% worse)")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cold-start and per-call cost of the zoneinfo and pytz timezone backends.
+
+    python benchmarks/tz_backends.py
+
+Every figure comes from a fresh interpreter per backend, so imports and
+table builds are measured cold.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints one JSON object
+PROBE = r"""
+import json, sys, time, timeit
+import zones
+start = time.perf_counter()
+backend = zones.get_backend()
+backend_ms = (time.perf_counter() - start) * 1000
+
+names = ["Europe/London", "America/New_York", "Asia/Tokyo", "Asia/Karachi", "Australia/Sydney"]
+start = time.perf_counter()
+for name in names:
+    zones.get_zone(name)
+tables_ms = (time.perf_counter() - start) * 1000 / len(names)
+
+start = time.perf_counter()
+import app
+app_import_ms = (time.perf_counter() - start) * 1000
+client = app.app.test_client()
+start = time.perf_counter()
+client.get("/api/time/London")
+first_request_ms = (time.perf_counter() - start) * 1000
+
+from datetime import datetime
+tz = backend.tzinfo("Europe/London")
+table = zones.get_zone("Europe/London")
+number = 200000
+native_ns = min(timeit.repeat(lambda: datetime.fromtimestamp(1700000000, tz), number=number, repeat=3)) / number * 1e9
+table_ns = min(timeit.repeat(lambda: table.localize(1700000000), number=number, repeat=3)) / number * 1e9
+print(json.dumps({
+    "backend": backend.name,
+    "backend_import_ms": backend_ms,
+    "table_build_ms_per_zone": tables_ms,
+    "app_import_ms": app_import_ms,
+    "first_request_ms": first_request_ms,
+    "native_fromtimestamp_ns": native_ns,
+    "table_localize_ns": table_ns,
+}))
+"""
+
+
+def measure(backend):
+    env = dict(os.environ, TIMESPOT_TZ_BACKEND=backend)
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per backend; the best run is kept")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in ("zoneinfo", "pytz"):
+        runs = [measure(backend) for _ in range(args.runs)]
+        best = {key: min(run[key] for run in runs) if key != "backend" else runs[0][key] for key in runs[0]}
+        results.append(best)
+        print(f"{best['backend']:<9} import {best['backend_import_ms']:6.1f} ms  "
+              f"table {best['table_build_ms_per_zone']:5.2f} ms/zone  app import {best['app_import_ms']:6.0f} ms  "
+              f"first request {best['first_request_ms']:5.1f} ms  "
+              f"fromtimestamp {best['native_fromtimestamp_ns']:5.0f} ns  table localize {best['table_localize_ns']:5.0f} ns")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Compact, memory-mapped city registry and the tool that builds it.
+
+The registry file stores columnar arrays (lat, lon, population, interned
+zone and country ids) plus a UTF-8 name blob, with records sorted by name
+so lookups are a binary search over the mapped bytes. Forked workers map
+the same file read-only and therefore share its pages.
+"""
+from bisect import bisect_left
+from collections.abc import Mapping
+import argparse
+import csv
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b"TSCITY1\0"
+HEADER = struct.Struct("<8s6I")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SEED_PATH = os.path.join(DATA_DIR, "cities.tsv")
+DEFAULT_PATH = os.path.join(DATA_DIR, "cities.bin")
+
+
+def _pad(size):
+    return -size % 8
+
+
+def _string_table(strings):
+    """Offsets array (n + 1 entries) and UTF-8 blob for a list of strings"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return offsets, b"".join(encoded)
+
+
+def build(records):
+    """Serialize (name, country, timezone, lat, lon, population) records to registry bytes"""
+    records = sorted(records, key=lambda r: r[0].encode("utf-8"))
+    zone_names = sorted({r[2] for r in records})
+    country_names = sorted({r[1] for r in records})
+    zone_ids = {name: i for i, name in enumerate(zone_names)}
+    country_ids = {name: i for i, name in enumerate(country_names)}
+
+    name_offsets, name_blob = _string_table([r[0] for r in records])
+    zone_offsets, zone_blob = _string_table(zone_names)
+    country_offsets, country_blob = _string_table(country_names)
+    columns = [
+        np.array([r[3] for r in records], dtype=np.float64),
+        np.array([r[4] for r in records], dtype=np.float64),
+        np.array([r[5] for r in records], dtype=np.uint32),
+        np.array([zone_ids[r[2]] for r in records], dtype=np.uint16),
+        np.array([country_ids[r[1]] for r in records], dtype=np.uint16),
+        name_offsets, zone_offsets, country_offsets,
+    ]
+
+    chunks = [HEADER.pack(MAGIC, len(records), len(zone_names), len(country_names),
+                          len(name_blob), len(zone_blob), len(country_blob))]
+    for part in [column.tobytes() for column in columns] + [name_blob, zone_blob, country_blob]:
+        chunks.append(part + b"\0" * _pad(len(part)))
+    return b"".join(chunks)
+
+
+def read_seed(path=SEED_PATH):
+    """Records from the tab-separated seed table shipped in data/"""
+    with open(path, encoding="utf-8", newline="") as f:
+        return [
+            (row["name"], row["country"], row["timezone"], float(row["lat"]), float(row["lon"]), int(row["population"]))
+            for row in csv.DictReader(f, delimiter="\t")
+        ]
+
+
+def read_geonames(path, country_info_path, taken=()):
+    """Records from a GeoNames citiesNNNN.txt dump, most populous first.
+
+    Names already in `taken` (e.g. the seed cities) are kept as they are;
+    clashes are disambiguated with the country, then the admin1 code.
+    """
+    countries = {}
+    with open(country_info_path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            countries[fields[0]] = fields[4]
+
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 18 or not fields[17]:
+                continue
+            country = countries.get(fields[8], fields[8])
+            rows.append((fields[1], country, fields[17], float(fields[4]), float(fields[5]),
+                         int(fields[14] or 0), fields[10]))
+    rows.sort(key=lambda row: -row[5])
+
+    seen = set(taken)
+    records = []
+    for name, country, zone, lat, lon, population, admin1 in rows:
+        for candidate in (name, f"{name}, {country}", f"{name}, {admin1}, {country}"):
+            if candidate not in seen:
+                seen.add(candidate)
+                records.append((candidate, country, zone, lat, lon, population))
+                break
+    return records
+
+
+class CityRegistry(Mapping):
+    """Read-only name -> city mapping over a memory-mapped registry file"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, count, zones, countries, name_size, zone_size, country_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("not a city registry file")
+
+        offset = HEADER.size
+
+        def take(dtype, n):
+            nonlocal offset
+            array = np.frombuffer(buffer, dtype=dtype, count=n, offset=offset)
+            offset += array.nbytes + _pad(array.nbytes)
+            return array
+
+        def blob(size):
+            nonlocal offset
+            start = offset
+            offset += size + _pad(size)
+            return start
+
+        self.lat = take(np.float64, count)
+        self.lon = take(np.float64, count)
+        self.population = take(np.uint32, count)
+        self.zone_ids = take(np.uint16, count)
+        self.country_ids = take(np.uint16, count)
+        # A plain memoryview indexes to Python ints far faster than numpy
+        # scalars, which matters inside the name binary search
+        self._name_offsets = memoryview(take(np.uint32, count + 1)).cast("B").cast("I")
+        zone_offsets = take(np.uint32, zones + 1)
+        country_offsets = take(np.uint32, countries + 1)
+        self._names_start = blob(name_size)
+        zones_start = blob(zone_size)
+        countries_start = blob(country_size)
+
+        # The interned zone and country tables are small; decode them once
+        self.zone_names = self._strings(zones_start, zone_offsets)
+        self.country_names = self._strings(countries_start, country_offsets)
+        self._count = count
+
+    def _strings(self, start, offsets):
+        return [self._buffer[start + offsets[i]:start + offsets[i + 1]].decode("utf-8")
+                for i in range(len(offsets) - 1)]
+
+    def _name_bytes(self, index):
+        start = self._names_start
+        return self._buffer[start + self._name_offsets[index]:start + self._name_offsets[index + 1]]
+
+    def name_at(self, index):
+        return self._name_bytes(index).decode("utf-8")
+
+    def index_of(self, name):
+        """Position of a city in the registry, or -1 if it is not there"""
+        if not isinstance(name, str):
+            return -1
+        try:
+            key = name.encode("utf-8")
+        except UnicodeEncodeError:
+            return -1
+        index = bisect_left(range(self._count), key, key=self._name_bytes)
+        if index < self._count and self._name_bytes(index) == key:
+            return index
+        return -1
+
+    def record(self, index):
+        return {
+            "timezone": self.zone_names[self.zone_ids[index]],
+            "country": self.country_names[self.country_ids[index]],
+            "lat": float(self.lat[index]),
+            "lon": float(self.lon[index]),
+            "population": int(self.population[index])
+        }
+
+    def __getitem__(self, name):
+        index = self.index_of(name)
+        if index < 0:
+            raise KeyError(name)
+        return self.record(index)
+
+    def __contains__(self, name):
+        return self.index_of(name) >= 0
+
+    def __iter__(self):
+        return (self.name_at(i) for i in range(self._count))
+
+    def __len__(self):
+        return self._count
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return CityRegistry(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def open_registry(path=None):
+    """Map the registry at path (default: $TIMESPOT_CITIES or data/cities.bin).
+
+    The default file is (re)built from the seed table when it is missing or
+    older than the seed; if it cannot be written the registry is kept in memory.
+    """
+    path = path or os.environ.get("TIMESPOT_CITIES") or DEFAULT_PATH
+    if path == DEFAULT_PATH and (
+        not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(SEED_PATH)
+    ):
+        data = build(read_seed())
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            return CityRegistry(data)
+    return load(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped city registry")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH)
+    parser.add_argument("--seed", default=SEED_PATH, help="tab-separated seed table")
+    parser.add_argument("--geonames", help="GeoNames cities dump, e.g. cities15000.txt")
+    parser.add_argument("--countries", help="GeoNames countryInfo.txt (required with --geonames)")
+    args = parser.parse_args()
+
+    records = read_seed(args.seed)
+    if args.geonames:
+        if not args.countries:
+            parser.error("--countries is required with --geonames")
+        records += read_geonames(args.geonames, args.countries, taken={r[0] for r in records})
+    data = build(records)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"wrote {len(records)} cities ({len(data)} bytes) to {args.output}")
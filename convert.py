@@ -0,0 +1,127 @@
+"""Batched, streaming timestamp conversion between zones and cities"""
+from datetime import datetime
+import json
+import numpy as np
+import zones
+
+BATCH_SIZE = 10000
+
+# Instants outside years 1-9999 cannot be rendered as local ISO-8601 times
+MIN_TS = -62135596800
+MAX_TS = 253402300799
+
+
+def parse_instant(value):
+    """(epoch seconds, is_wall_time) for an epoch number or an ISO-8601 string.
+
+    Strings without a UTC offset are wall-clock times in the source zone.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not MIN_TS <= value <= MAX_TS:
+            raise ValueError("ts is out of range")
+        return float(value), False
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            return (parsed - datetime(1970, 1, 1)).total_seconds(), True
+        # An offset can carry a time at either end of the calendar past it
+        ts = parsed.timestamp()
+        if not MIN_TS <= ts <= MAX_TS:
+            raise ValueError("ts is out of range")
+        return ts, False
+    raise ValueError("ts must be an epoch number or an ISO-8601 string")
+
+
+def convert_batch(records, resolve_zone):
+    """Convert {"ts", "from", "to"} records; returns one result dict per record, in order"""
+    count = len(records)
+    ts = np.zeros(count)
+    wall_rows = {}
+    target_rows = {}
+    results = [None] * count
+
+    for i, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("record must be an object")
+            instant, is_wall = parse_instant(record.get("ts"))
+            target = resolve_zone(record.get("to", "UTC"))
+            if target is None:
+                raise ValueError(f"unknown zone or city: {record.get('to')}")
+            if is_wall:
+                source = resolve_zone(record.get("from", "UTC"))
+                if source is None:
+                    raise ValueError(f"unknown zone or city: {record.get('from')}")
+                wall_rows.setdefault(source, []).append(i)
+        except (TypeError, ValueError) as e:
+            results[i] = {"error": str(e)}
+            continue
+        ts[i] = instant
+        target_rows.setdefault(target, []).append(i)
+
+    # Zone maths runs once per distinct zone over all of its rows
+    for source, rows in wall_rows.items():
+        ts[rows] = zones.local_to_utc(zones.get_zone(source), ts[rows])
+
+    offsets = np.zeros(count, dtype=np.int64)
+    for target, rows in target_rows.items():
+        offsets[rows] = zones.get_zone(target).offsets_at(ts[rows])
+    local = np.datetime_as_string((np.floor(ts).astype(np.int64) + offsets).astype("datetime64[s]")).tolist()
+    utc = ts.tolist()
+    offsets = offsets.tolist()
+
+    for target, rows in target_rows.items():
+        for i in rows:
+            instant = utc[i]
+            results[i] = {
+                "utc": int(instant) if instant.is_integer() else instant,
+                "local": local[i] + zones.format_offset(offsets[i], ":"),
+                "offset": offsets[i],
+                "zone": target
+            }
+    return results
+
+
+def read_ndjson(stream, chunk_size=1 << 16):
+    """Records from a newline-delimited JSON byte stream, read a chunk at a time"""
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_line(line)
+    if pending.strip():
+        yield parse_line(pending)
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def convert_stream(records, resolve_zone, batch_size=BATCH_SIZE):
+    """Convert an iterable of records batch by batch, yielding NDJSON chunks"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield encode(convert_batch(batch, resolve_zone))
+            batch = []
+    if batch:
+        yield encode(convert_batch(batch, resolve_zone))
+
+
+def encode(results):
+    # Successful results have a fixed shape and JSON-safe values, so they
+    # skip the generic encoder
+    return "".join(
+        json.dumps(result) + "\n" if "error" in result else
+        f'{{"utc": {result["utc"]}, "local": "{result["local"]}", "offset": {result["offset"]}, "zone": "{result["zone"]}"}}\n'
+        for result in results
+    )
@@ -0,0 +1,154 @@
+"""Per-user dashboards (main city and card cities) kept in SQLite.
+
+Each save bumps the dashboard's version, and the client holds the version
+in its cookie next to the user id. The cache only answers when it holds
+the version the cookie names, so it never needs invalidating across worker
+processes: a save in one worker hands the client a version the other
+workers' caches do not have, and they read it back once. Returning
+visitors are served from memory.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from cache import LRUCache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_PATH = os.path.join(DATA_DIR, "dashboards.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dashboards (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    main_city TEXT NOT NULL,
+    cities TEXT NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+# Constant statement text, so each connection prepares these once and
+# reuses them from its statement cache
+SELECT = "SELECT version, main_city, cities FROM dashboards WHERE user_id = ?"
+UPSERT = """
+INSERT INTO dashboards (user_id, version, main_city, cities, updated) VALUES (?, 1, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    version = version + 1, main_city = excluded.main_city, cities = excluded.cities, updated = excluded.updated
+RETURNING version
+"""
+
+COOKIE = "timespot_dashboard"
+_COOKIE_VALUE = re.compile(r"([A-Za-z0-9_-]{16,64})\.(\d{1,12})")
+
+Dashboard = namedtuple("Dashboard", "version main_city cities")
+
+
+def parse_cookie(value):
+    """(user id, version) from a dashboard cookie, or (None, None)"""
+    match = _COOKIE_VALUE.fullmatch(value or "")
+    if match is None:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def cookie_value(user_id, version):
+    return f"{user_id}.{version}"
+
+
+def new_user_id():
+    return secrets.token_urlsafe(16)
+
+
+class ConnectionPool:
+    """Up to size SQLite connections shared by a process's threads.
+
+    Connections are opened on demand and never cross a fork: a process
+    that did not open the pool starts its own.
+    """
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        # WAL lets every worker read while one writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(SCHEMA)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            idle = self._idle
+            try:
+                connection = idle.get_nowait()
+            except queue.Empty:
+                connection = None
+                if self._opened < self.size:
+                    self._opened += 1
+                    opening = True
+                else:
+                    opening = False
+        if connection is None and not opening:
+            connection = idle.get()
+        elif connection is None:
+            try:
+                connection = self._open()
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            yield connection
+        finally:
+            idle.put(connection)
+
+
+class DashboardStore:
+    """Dashboards by user id, read through an LRU cache of each user's latest one"""
+
+    def __init__(self, path=None, pool_size=4, cache_size=10000):
+        self.path = path or os.environ.get("TIMESPOT_DB") or DEFAULT_PATH
+        self.pool = ConnectionPool(self.path, pool_size)
+        self.cache = LRUCache(maxsize=cache_size, name="dashboards")
+
+    def get(self, user_id, version):
+        """The user's dashboard (None if there is none); a database read only
+        when this process has not seen that version yet"""
+        dashboard = self.cache.get(user_id)
+        if dashboard is not None and dashboard.version == version:
+            return dashboard
+        with self.pool.connection() as connection:
+            row = connection.execute(SELECT, (user_id,)).fetchone()
+        if row is None:
+            return None
+        dashboard = Dashboard(row[0], row[1], json.loads(row[2]))
+        self.cache.put(user_id, dashboard)
+        return dashboard
+
+    def save(self, user_id, main_city, cities):
+        """Store a dashboard and return it with its new version"""
+        with self.pool.connection() as connection:
+            # Fetching every row finishes the statement, which commits it
+            [(version,)] = connection.execute(
+                UPSERT, (user_id, main_city, json.dumps(cities), time.time())
+            ).fetchall()
+        dashboard = Dashboard(version, main_city, list(cities))
+        self.cache.put(user_id, dashboard)
+        return dashboard
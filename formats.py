@@ -0,0 +1,30 @@
+"""Binary encodings of time API responses, chosen by the Accept header"""
+try:
+    import msgpack
+except ImportError:  # in requirements.txt; not offered without it
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # in requirements.txt; not offered without it
+    cbor2 = None
+
+JSON = "application/json"
+
+# Mimetype -> encoder, for the encodings whose package is installed
+ENCODERS = {}
+if msgpack is not None:
+    ENCODERS["application/msgpack"] = ENCODERS["application/x-msgpack"] = msgpack.packb
+if cbor2 is not None:
+    ENCODERS["application/cbor"] = cbor2.dumps
+
+
+def negotiate(accept):
+    """The binary mimetype the client prefers to JSON, or None for JSON.
+
+    accept is a request's accept_mimetypes. JSON comes first, so */* and
+    missing Accept headers get JSON, as does asking only for an encoding
+    that is not installed.
+    """
+    best = accept.best_match([JSON, *ENCODERS], default=JSON)
+    return None if best == JSON else best
@@ -0,0 +1,96 @@
+"""Roughly equal-area lat/lon grid index for nearest-city lookups on the sphere"""
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+POINTS_PER_CELL = 4
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Points bucketed into latitude rows split into ~square cells.
+
+    Rows near the poles hold fewer, wider cells, so every cell spans about
+    the same distance and a search cap never needs to visit thousands of
+    slivers. Queries grow a spherical cap until it holds k points.
+    """
+
+    def __init__(self, lat, lon, cell_degrees=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        if cell_degrees is None:
+            # About POINTS_PER_CELL points per cell if they were spread evenly
+            sphere_square_degrees = 4 * math.pi * (180 / math.pi) ** 2
+            cell_degrees = math.sqrt(sphere_square_degrees * POINTS_PER_CELL / max(len(self.lat), 1))
+            cell_degrees = min(max(cell_degrees, 0.25), 30.0)
+        self.cell = cell_degrees
+        self.rows = int(math.ceil(180 / cell_degrees))
+
+        centers = -90 + (np.arange(self.rows) + 0.5) * cell_degrees
+        self.row_cols = np.maximum(1, np.ceil(360 * np.cos(np.radians(centers)) / cell_degrees)).astype(np.int64)
+        self.row_first = np.concatenate([[0], np.cumsum(self.row_cols)])
+
+        # Points sorted by cell id; cell c holds order[starts[c]:starts[c + 1]]
+        rows = self._row(self.lat)
+        cells = self.row_first[rows] + self._col(self.lon, self.row_cols[rows])
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.row_first[-1] + 1))
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell).astype(np.int64), 0, self.rows - 1)
+
+    def _col(self, lon, cols):
+        return (((np.asarray(lon) + 180) / 360 * cols) // 1).astype(np.int64) % cols
+
+    def _cap(self, lat, lon, radius_km):
+        """Point indexes in every cell that intersects the cap of radius_km around (lat, lon)"""
+        angle = radius_km / EARTH_RADIUS_KM
+        spread = math.degrees(angle)
+        first, last = self._row(lat - spread), self._row(lat + spread)
+
+        # Widest longitude reach of the cap; a cap over a pole covers every meridian
+        cos_lat = math.cos(math.radians(lat))
+        if abs(lat) + spread >= 90 or math.sin(angle) >= cos_lat:
+            reach = 180.0
+        else:
+            reach = math.degrees(math.asin(math.sin(angle) / cos_lat))
+
+        chunks = []
+        for row in range(int(first), int(last) + 1):
+            cols = int(self.row_cols[row])
+            if reach >= 180:
+                columns = range(cols)
+            else:
+                west = int(self._col(lon - reach, cols))
+                east = int(self._col(lon + reach, cols))
+                columns = [(west + i) % cols for i in range((east - west) % cols + 1)]
+            base = int(self.row_first[row])
+            for col in columns:
+                start, end = self.starts[base + col], self.starts[base + col + 1]
+                if end > start:
+                    chunks.append(self.order[start:end])
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def nearest(self, lat, lon, k=1):
+        """(indexes, distances_km) of the k nearest points, nearest first"""
+        k = min(k, len(self.lat))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius_km = self.cell * KM_PER_DEGREE
+        while True:
+            candidates = self._cap(lat, lon, radius_km)
+            distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+            inside = distances <= radius_km
+            # Anything outside the cap is farther than everything inside it
+            if np.count_nonzero(inside) >= k or radius_km >= math.pi * EARTH_RADIUS_KM:
+                best = np.argsort(distances, kind="stable")[:k]
+                return candidates[best], distances[best]
+            radius_km *= 2
+
@@ -0,0 +1,25 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '80')}"
+
+# The app is built and warmed once in the master, then forked: workers share
+# the city registry, zone tables, search and grid indexes copy-on-write
+wsgi_app = "app:create_app(warm=True)"
+preload_app = True
+
+# One worker per CPU this process may run on, at most 4. Each worker adds a
+# snapshot ticker, a SQLite pool and GUNICORN_THREADS threads, and on hosts
+# that share CPUs by quota (ECS on EC2, for one) the CPUs in view are the
+# host's, not the container's. Set WEB_CONCURRENCY to size it for the task.
+workers = int(os.environ.get("WEB_CONCURRENCY", min(len(os.sched_getaffinity(0)), 4)))
+
+# /api/stream holds a thread for as long as the client stays connected, so
+# workers are threaded rather than sync
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+keepalive = 5
+timeout = 60
+graceful_timeout = 10
+errorlog = "-"
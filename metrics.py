@@ -0,0 +1,200 @@
+"""Per-route request metrics in Prometheus text format.
+
+Each thread records into its own shard, so the request path never takes a
+lock; shards are only summed (and those of finished threads folded away)
+when /metrics is scraped. Counters are per process: under gunicorn each
+worker reports its own.
+"""
+from bisect import bisect_left
+import threading
+import time
+from flask import request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Series layout: [count, latency sum, size sum, *latency buckets, *size buckets]
+_LATENCY = 3
+_SIZE = _LATENCY + len(LATENCY_BUCKETS) + 1
+_WIDTH = _SIZE + len(SIZE_BUCKETS) + 1
+
+
+class _Shard:
+    def __init__(self, thread):
+        self.thread = thread
+        self.series = {}
+        self.started = 0
+        self.finished = 0
+        # Start time of the request the thread is handling
+        self.start = None
+
+
+def _merge(into, series):
+    for key, values in series.items():
+        total = into.setdefault(key, [0] * _WIDTH)
+        for i, value in enumerate(values):
+            total[i] += value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """Request counters and histograms recorded through Flask request hooks"""
+
+    def __init__(self, namespace="timespot"):
+        self.namespace = namespace
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+        self._caches = []
+        self._counters = []
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def register_cache(self, cache, name=None):
+        """Export an LRUCache, or a functools.lru_cache function under name"""
+        if hasattr(cache, "stats"):
+            self._caches.append(cache.stats)
+        else:
+            def stats():
+                info = cache.cache_info()
+                return {"name": name, "size": info.currsize, "maxsize": info.maxsize,
+                        "hits": info.hits, "misses": info.misses}
+            self._caches.append(stats)
+
+    def register_counter(self, name, help_text, label, values):
+        """Export a counter per label value; values() returns {label value: count}"""
+        self._counters.append((name, help_text, label, values))
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            # Once per thread, never per request
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _before(self):
+        shard = self._shard()
+        shard.started += 1
+        shard.start = time.perf_counter()
+
+    def _after(self, response):
+        shard = self._shard()
+        if shard.start is None:
+            return response
+        elapsed = time.perf_counter() - shard.start
+        shard.start = None
+        rule = request.url_rule
+        key = (rule.rule if rule is not None else "unmatched", request.method, response.status_code)
+
+        series = shard.series.get(key)
+        if series is None:
+            series = shard.series[key] = [0] * _WIDTH
+        series[0] += 1
+        series[1] += elapsed
+        series[_LATENCY + bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        # Streamed bodies have no length up front and are left out of the sizes
+        size = response.content_length
+        if size is not None:
+            series[2] += size
+            series[_SIZE + bisect_left(SIZE_BUCKETS, size)] += 1
+        return response
+
+    def _teardown(self, exc):
+        self._shard().finished += 1
+
+    def collect(self):
+        """(series by (route, method, status), requests in flight)"""
+        with self._lock:
+            # Fold shards of threads that have exited (the dev server starts
+            # one per request) so the shard list stays bounded
+            for shard in [s for s in self._shards if not s.thread.is_alive()]:
+                self._shards.remove(shard)
+                _merge(self._retired.series, shard.series)
+                self._retired.started += shard.started
+                self._retired.finished += shard.finished
+            shards = [self._retired] + self._shards
+
+            totals = {}
+            in_flight = 0
+            for shard in shards:
+                # A live thread may add a series while it is copied
+                _merge(totals, dict(shard.series))
+                in_flight += shard.started - shard.finished
+        return totals, in_flight
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        series, in_flight = self.collect()
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_http_requests_total Requests handled, by route, method and status.",
+            f"# TYPE {ns}_http_requests_total counter",
+        ]
+        for (route, method, status), values in sorted(series.items()):
+            lines.append(f"{ns}_http_requests_total{_labels(route=route, method=method, status=status)} {values[0]}")
+
+        by_route = {}
+        for (route, method, _status), values in series.items():
+            _merge(by_route, {(route, method): values})
+        for metric, help_text, buckets, offset, sum_index in (
+            ("http_request_duration_seconds", "Time from routing to response, in seconds.",
+             LATENCY_BUCKETS, _LATENCY, 1),
+            ("http_response_size_bytes", "Response body sizes of non-streamed responses, in bytes.",
+             SIZE_BUCKETS, _SIZE, 2),
+        ):
+            lines.append(f"# HELP {ns}_{metric} {help_text}")
+            lines.append(f"# TYPE {ns}_{metric} histogram")
+            for (route, method), values in sorted(by_route.items()):
+                counts = values[offset:offset + len(buckets) + 1]
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f"{ns}_{metric}_bucket{_labels(route=route, method=method, le=bound)} {cumulative}")
+                lines.append(f"{ns}_{metric}_sum{_labels(route=route, method=method)} {values[sum_index]}")
+                lines.append(f"{ns}_{metric}_count{_labels(route=route, method=method)} {cumulative}")
+
+        lines += [
+            f"# HELP {ns}_http_requests_in_flight Requests currently being handled.",
+            f"# TYPE {ns}_http_requests_in_flight gauge",
+            f"{ns}_http_requests_in_flight {in_flight}",
+        ]
+
+        for name, help_text, label, values in self._counters:
+            lines.append(f"# HELP {ns}_{name}_total {help_text}")
+            lines.append(f"# TYPE {ns}_{name}_total counter")
+            for value, count in sorted(values().items()):
+                lines.append(f"{ns}_{name}_total{_labels(**{label: value})} {count}")
+
+        caches = [stats() for stats in self._caches]
+        for field, kind, help_text in (
+            ("hits", "counter", "Cache lookups answered from the cache."),
+            ("misses", "counter", "Cache lookups that had to compute the value."),
+            ("evictions", "counter", "Entries dropped to stay within maxsize."),
+            ("size", "gauge", "Entries currently cached."),
+            ("maxsize", "gauge", "Configured cache capacity."),
+        ):
+            name = f"{ns}_cache_{field}_total" if kind == "counter" else f"{ns}_cache_{field}"
+            present = [stats for stats in caches if stats.get(field) is not None]
+            if not present:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stats in present:
+                lines.append(f"{name}{_labels(cache=stats['name'])} {stats[field]}")
+        return "\n".join(lines) + "\n"
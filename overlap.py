@@ -0,0 +1,56 @@
+"""Vectorized working-hours overlap between timezones"""
+import numpy as np
+import zones
+
+
+def working_intervals(zone_name, first_day, last_day, start, end, weekdays_only=False):
+    """UTC [start, end) intervals of a daily local window over local days first_day..last_day.
+
+    Days are counted since 1970-01-01 and start/end are seconds after local
+    midnight; a window with end <= start runs past midnight. The arithmetic
+    goes through the zone's transition table, so DST changes are exact.
+    """
+    table = zones.get_zone(zone_name)
+    days = np.arange(first_day, last_day + 1, dtype=np.int64)
+    if weekdays_only:
+        # 1970-01-01 was a Thursday; Monday = 0
+        days = days[(days + 3) % 7 < 5]
+    midnight = days * 86400
+    starts = zones.local_to_utc(table, midnight + start)
+    ends = zones.local_to_utc(table, midnight + end + (86400 if end <= start else 0))
+    return starts, ends
+
+
+def intersect(interval_sets, lower, upper):
+    """Intersection of several sets of disjoint intervals, clipped to [lower, upper).
+
+    Sweeps every start (+1) and end (-1) in time order; wherever the running
+    count equals the number of sets, all of them are inside a window.
+    """
+    count = len(interval_sets)
+    if count == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    times = np.concatenate([np.concatenate([s, e]) for s, e in interval_sets])
+    deltas = np.concatenate([np.concatenate([np.ones(len(s), np.int64), -np.ones(len(e), np.int64)])
+                             for s, e in interval_sets])
+    # Ends sort before starts at the same instant, so touching windows do
+    # not produce zero-length overlaps
+    order = np.lexsort((deltas, times))
+    times, running = times[order], np.cumsum(deltas[order])
+
+    inside = np.nonzero(running[:-1] == count)[0]
+    starts = np.clip(times[inside], lower, upper).astype(np.int64)
+    ends = np.clip(times[inside + 1], lower, upper).astype(np.int64)
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+def overlaps(zone_names, first_day, last_day, start, end, weekdays_only=False):
+    """UTC intervals between first_day 00:00 UTC and last_day 24:00 UTC when
+    every zone is inside its local working window"""
+    # Local days one either side cover windows that cross the UTC range edges
+    interval_sets = [
+        working_intervals(name, first_day - 1, last_day + 1, start, end, weekdays_only)
+        for name in dict.fromkeys(zone_names)
+    ]
+    return intersect(interval_sets, first_day * 86400, (last_day + 1) * 86400)
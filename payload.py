@@ -0,0 +1,84 @@
+"""Immutable responses serialized and compressed once, served by content negotiation"""
+import gzip
+import hashlib
+import json
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone is served without it
+    brotli = None
+
+
+class Payload:
+    """A response body with its gzip/brotli encodings, each under its own strong ETag"""
+
+    def __init__(self, body, mimetype="application/json", max_age=3600):
+        self.mimetype = mimetype
+        self.max_age = max_age
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {"identity": body}
+        # Compressed forms only pay off above a packet or so
+        if len(body) > 1024:
+            self.encodings["gzip"] = gzip.compress(body, 9, mtime=0)
+            if brotli is not None:
+                self.encodings["br"] = brotli.compress(body, quality=11)
+        # A strong validator names one exact byte sequence, so each
+        # content-coding gets its own
+        self.etags = {name: self.etag if name == "identity" else f"{self.etag}-{name}" for name in self.encodings}
+
+    def __len__(self):
+        return len(self.encodings["identity"])
+
+    def response(self, request, headers=None):
+        """304 if the client already has this body in any encoding, else the
+        smallest encoding it accepts"""
+        # If-None-Match compares weakly: a proxy may have weakened the tag
+        held = next((etag for etag in self.etags.values() if request.if_none_match.contains_weak(etag)), None)
+        if held is not None:
+            response = Response(status=304)
+            response.set_etag(held)
+        else:
+            encoding = min(
+                (name for name in self.encodings if name == "identity" or name in request.accept_encodings),
+                key=lambda name: len(self.encodings[name])
+            )
+            response = Response(self.encodings[encoding], mimetype=self.mimetype)
+            if encoding != "identity":
+                response.content_encoding = encoding
+            response.set_etag(self.etags[encoding])
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.headers.update(headers or {})
+        return response
+
+
+class JSONObjectFragments:
+    """A JSON object of records serialized one member at a time, so any slice
+    of keys or subset of fields is a join of pre-encoded bytes.
+
+    Output matches Flask's compact, key-sorted jsonify() body.
+    """
+
+    def __init__(self, records):
+        self.keys = sorted(records)
+        self.fields = sorted({field for record in records.values() for field in record})
+        self._names = [json.dumps(key).encode() for key in self.keys]
+        self._values = {
+            field: [json.dumps(records[key].get(field), separators=(",", ":")).encode() for key in self.keys]
+            for field in self.fields
+        }
+        self._labels = {field: json.dumps(field).encode() for field in self.fields}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def encode(self, start=0, stop=None, fields=None):
+        """Bytes of the object holding keys[start:stop] with only the given fields"""
+        fields = sorted(fields) if fields is not None else self.fields
+        members = []
+        for i in range(*slice(start, stop).indices(len(self.keys))):
+            record = b",".join(self._labels[f] + b":" + self._values[f][i] for f in fields)
+            members.append(self._names[i] + b":{" + record + b"}")
+        return b"{" + b",".join(members) + b"}\n"
@@ -0,0 +1,125 @@
+"""Opt-in per-request stage timing, reported in a Server-Timing header.
+
+Enabled only when TIMESPOT_PROFILE_TOKEN is set; callers then send the token
+in an X-Profile-Token header or a ?profile= query argument. With
+TIMESPOT_PROFILE_DIR set as well, a TIMESPOT_PROFILE_SAMPLE fraction of those
+requests (default all) also run under cProfile and are dumped there as .prof
+files.
+
+Stages are timed by wrapping the functions that implement them, and only
+when profiling is enabled: without the token nothing is wrapped and no
+request hooks are installed.
+"""
+import cProfile
+import functools
+import hmac
+import os
+import random
+import threading
+import time
+from flask import request
+
+_state = threading.local()
+
+# Only one cProfile capture runs at a time; concurrent requests skip it
+_capture_lock = threading.Lock()
+
+
+def timed(name, fn):
+    """fn, adding its run time to stage name of the current request when that request is profiled"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        timings = getattr(_state, "timings", None)
+        if timings is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # Repeated stages (one per zone, say) add up
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    wrapper.stage = name
+    return wrapper
+
+
+def server_timing(timings, total):
+    """Server-Timing header value; durations are in milliseconds"""
+    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+
+class Profiler:
+    """Flask hooks that switch stage timing (and sampled cProfile) on per request"""
+
+    def __init__(self, token=None, dump_dir=None, sample=None):
+        self.token = token if token is not None else os.environ.get("TIMESPOT_PROFILE_TOKEN")
+        self.dump_dir = dump_dir if dump_dir is not None else os.environ.get("TIMESPOT_PROFILE_DIR")
+        self.sample = sample if sample is not None else float(os.environ.get("TIMESPOT_PROFILE_SAMPLE", "1"))
+        self.enabled = bool(self.token)
+
+    def instrument(self, namespace, **stages):
+        """Replace namespace[function] with a timed wrapper for each stage=function"""
+        if not self.enabled:
+            return
+        for name, function in stages.items():
+            if getattr(namespace[function], "stage", None) is None:
+                namespace[function] = timed(name, namespace[function])
+
+    def active(self):
+        """Whether the current request is being profiled"""
+        return self.enabled and getattr(_state, "timings", None) is not None
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        if self.dump_dir:
+            os.makedirs(self.dump_dir, exist_ok=True)
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _authorized(self):
+        supplied = request.headers.get("X-Profile-Token") or request.args.get("profile")
+        return supplied is not None and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def _before(self):
+        if not self._authorized():
+            return
+        _state.timings = {}
+        _state.start = time.perf_counter()
+        _state.profile = None
+        if self.dump_dir and random.random() < self.sample and _capture_lock.acquire(blocking=False):
+            _state.profile = cProfile.Profile()
+            _state.profile.enable()
+
+    def _after(self, response):
+        timings = getattr(_state, "timings", None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - _state.start
+        profile = self._stop_capture()
+        if profile is not None:
+            endpoint = (request.endpoint or "unmatched").replace(".", "_")
+            path = os.path.join(self.dump_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{endpoint}.prof")
+            profile.dump_stats(path)
+            response.headers["X-Profile-Dump"] = os.path.basename(path)
+        response.headers["Server-Timing"] = server_timing(timings, total)
+        # A profiled response must not be served to anyone else from a cache
+        response.cache_control.no_store = True
+        _state.timings = None
+        return response
+
+    def _teardown(self, exc):
+        # Requests that failed before after_request still end profiling
+        self._stop_capture()
+        _state.timings = None
+
+    def _stop_capture(self):
+        profile = getattr(_state, "profile", None)
+        if profile is None:
+            return None
+        profile.disable()
+        _state.profile = None
+        _capture_lock.release()
+        return profile
@@ -0,0 +1,124 @@
+"""Prefix and trigram indexes for accent-insensitive city search"""
+from bisect import bisect_left
+import re
+import unicodedata
+import numpy as np
+
+# Match tiers, best first
+EXACT, NAME_PREFIX, WORD_PREFIX, AREA, FUZZY = range(5)
+
+# Prefixes this short match too many names to scan per query, so their
+# best results are precomputed
+SHORT_PREFIX = 3
+SHORT_PREFIX_RESULTS = 50
+
+# Fuzzy matching looks up at most this many of the query's trigrams
+FUZZY_TRIGRAMS = 4
+
+# Substring scans of the prefix index stop after this many entries
+SCAN_LIMIT = 5000
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation: "São Paulo" -> "sao paulo\""""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"[\W_]+", " ", text.casefold()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """City search over a CityRegistry, built once at startup"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.population = np.asarray(registry.population, dtype=np.int64)
+
+        keys = []
+        postings = {}
+        self._names = []
+        for index, name in enumerate(registry):
+            normalized = normalize(name)
+            self._names.append(normalized)
+            keys.append((normalized, NAME_PREFIX, index))
+            for match in re.finditer(r" (?=\S)", normalized):
+                keys.append((normalized[match.end():], WORD_PREFIX, index))
+            for gram in trigrams(normalized):
+                postings.setdefault(gram, []).append(index)
+        keys.sort()
+        self._keys = [key for key, _tier, _index in keys]
+        self._tiers = np.array([tier for _key, tier, _index in keys], dtype=np.int8)
+        self._ids = np.array([index for _key, _tier, index in keys], dtype=np.int64)
+        self._trigrams = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+        # Countries and zones ("America/Sao_Paulo" -> "america sao paulo"),
+        # each with its cities ordered by population
+        zone_ids = np.asarray(registry.zone_ids)
+        country_ids = np.asarray(registry.country_ids)
+        self._areas = []
+        for names, ids in ((registry.country_names, country_ids), (registry.zone_names, zone_ids)):
+            for area_id, area_name in enumerate(names):
+                members = np.nonzero(ids == area_id)[0]
+                members = members[np.argsort(-self.population[members], kind="stable")]
+                self._areas.append((normalize(area_name), members[:SHORT_PREFIX_RESULTS]))
+
+        self._short = {}
+        for position, key in enumerate(self._keys):
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                self._short.setdefault(key[:length], []).append(position)
+        for prefix, positions in self._short.items():
+            positions = np.array(positions, dtype=np.int64)
+            self._short[prefix] = self._rank(self._tiers[positions], self._ids[positions], SHORT_PREFIX_RESULTS)
+
+    def _rank(self, tiers, ids, limit):
+        """Best (tier, id) pairs: lowest tier first, then highest population"""
+        order = np.lexsort((-self.population[ids], tiers))[:limit * 4]
+        seen = {}
+        for i in order:
+            seen.setdefault(int(ids[i]), int(tiers[i]))
+            if len(seen) == limit:
+                break
+        return list(seen.items())
+
+    def search(self, query, limit=10):
+        """Registry indexes of the best matches for query, best first"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        if len(query) <= SHORT_PREFIX:
+            candidates = dict(self._short.get(query, []))
+        else:
+            start = bisect_left(self._keys, query)
+            end = bisect_left(self._keys, query + "\uffff", start, min(start + SCAN_LIMIT, len(self._keys)))
+            candidates = dict(self._rank(self._tiers[start:end], self._ids[start:end], limit))
+
+        for index, tier in candidates.items():
+            if tier == NAME_PREFIX and self._names[index] == query:
+                candidates[index] = EXACT
+
+        for area_name, members in self._areas:
+            if f" {query}" in f" {area_name}":
+                for index in members[:limit]:
+                    candidates.setdefault(int(index), AREA)
+
+        if len(candidates) < limit and len(query) >= 3:
+            # Candidates come from the query's rarest trigrams only; common
+            # ones ("san", " sa") would drag in a large share of the table
+            grams = sorted((self._trigrams[g] for g in trigrams(query) if g in self._trigrams), key=len)
+            grams = grams[:FUZZY_TRIGRAMS]
+            if grams:
+                ids, counts = np.unique(np.concatenate(grams), return_counts=True)
+                # Require at least half of those trigrams to match
+                keep = counts * 2 >= len(grams)
+                ids, counts = ids[keep], counts[keep]
+                order = np.lexsort((-self.population[ids], -counts))[:limit]
+                for index in ids[order]:
+                    candidates.setdefault(int(index), FUZZY)
+
+        ranked = sorted(candidates.items(), key=lambda item: (item[1], -self.population[item[0]]))
+        return [index for index, _tier in ranked[:limit]]
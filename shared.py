@@ -0,0 +1,105 @@
+"""Per-second city snapshot table in memory shared by every worker process.
+
+The table lives in an anonymous shared mapping created before the server
+forks, so each worker sees the same pages. One process (whichever holds
+the writer lock) publishes each second's rows under a sequence lock; the
+others read without locking and retry if a publish overlapped their read.
+"""
+import fcntl
+import mmap
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+
+# Fixed-width rows; offsets are in seconds, strings ASCII and NUL-padded
+ZONE_ROW = np.dtype([
+    ("day", "<i4"),
+    ("offset", "<i4"),
+    ("time", "S8"),
+    ("date", "S32"),
+    ("time_of_day", "S8"),
+    ("timezone", "S16"),
+    ("utc_offset", "S8"),
+])
+CITY_ROW = np.dtype([
+    ("sunrise", "S8"),
+    ("sunset", "S8"),
+    ("duration", "S8"),
+])
+
+# Header: sequence number (odd while a publish is in progress), second
+HEADER = np.dtype([("seq", "<u8"), ("second", "<i8")])
+
+# Readers unpack single rows with struct, several times faster than
+# indexing the numpy views
+_HEADER = struct.Struct("<Qq")
+_ZONE = struct.Struct("<ii8s32s8s16s8s")
+_CITY = struct.Struct("<8s8s8s")
+assert (_HEADER.size, _ZONE.size, _CITY.size) == (HEADER.itemsize, ZONE_ROW.itemsize, CITY_ROW.itemsize)
+
+
+class SnapshotTable:
+    """Zone and city rows for one wall-clock second, behind a sequence lock"""
+
+    def __init__(self, zone_count, city_count):
+        self._zones_at = HEADER.itemsize
+        self._cities_at = self._zones_at + ZONE_ROW.itemsize * zone_count
+        self.size = self._cities_at + CITY_ROW.itemsize * city_count
+        # fileno -1 maps shared anonymous memory, inherited across fork
+        self._buffer = mmap.mmap(-1, self.size)
+        self.header = np.frombuffer(self._buffer, HEADER, 1, 0)
+        self.zones = np.frombuffer(self._buffer, ZONE_ROW, zone_count, self._zones_at)
+        self.cities = np.frombuffer(self._buffer, CITY_ROW, city_count, self._cities_at)
+        # POSIX record locks belong to a process, not to the inherited file
+        # descriptor, so each worker contends for this one separately and a
+        # dead writer's lock is released by the kernel
+        self._lock_file = tempfile.TemporaryFile()
+        # The sequence lock has room for one writer: a second thread would
+        # make seq even again while the first was still copying rows
+        self._publishing = threading.Lock()
+
+    def try_lead(self):
+        """Become the process that publishes, if no live process is"""
+        try:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def resign(self):
+        fcntl.lockf(self._lock_file, fcntl.LOCK_UN)
+
+    @property
+    def second(self):
+        return _HEADER.unpack_from(self._buffer)[1]
+
+    def publish(self, second, zone_rows, city_rows):
+        """Replace every row; only one process may call this (see try_lead),
+        and its threads take turns"""
+        with self._publishing:
+            header = self.header[0]
+            # Odd while writing; a writer that died mid-publish may have left
+            # it odd already
+            seq = int(header["seq"]) | 1
+            header["seq"] = seq
+            self.zones[:] = zone_rows
+            self.cities[:] = city_rows
+            header["second"] = second
+            header["seq"] = seq + 1
+
+    def read(self, zone, city):
+        """(second, zone row, city row) as one consistent copy; strings keep their NUL padding"""
+        buffer = self._buffer
+        while True:
+            seq, second = _HEADER.unpack_from(buffer)
+            if not seq & 1:
+                zone_row = _ZONE.unpack_from(buffer, self._zones_at + zone * _ZONE.size)
+                city_row = _CITY.unpack_from(buffer, self._cities_at + city * _CITY.size)
+                if _HEADER.unpack_from(buffer)[0] == seq:
+                    return second, zone_row, city_row
+            # A publish is in progress; let the writer (which may be a
+            # thread of this process) finish. If the writer died mid-publish
+            # this waits for the worker that takes over to publish.
+            time.sleep(0)
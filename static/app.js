@@ -0,0 +1,207 @@
+const bootstrap = JSON.parse(document.getElementById('bootstrap').textContent);
+let currentFormat = '24h';
+let currentMainCity = bootstrap.mainCity;
+// The visitor's saved card cities; the server remembers them by cookie
+let dashboardCities = bootstrap.cities;
+let addingCity = false;
+
+// Every clock on the page ticks locally from its city's UTC offset. The
+// offsets, with each city's next transition, are only refetched once the
+// earliest transition passes or the server's resync interval runs out.
+let schedule = {};
+let skewMs = 0;
+let resyncTimer;
+let tickTimer;
+
+const DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'];
+const MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+
+const pad = n => String(n).padStart(2, '0');
+
+function loadSchedule(cities) {
+    const requested = Date.now();
+    return fetch(`/api/offsets?cities=${encodeURIComponent(cities.join(','))}`)
+        .then(response => response.json())
+        .then(data => {
+            const received = Date.now();
+            // Assume the server read its clock halfway through the round trip
+            skewMs = data.server_time * 1000 - (requested + received) / 2;
+            Object.assign(schedule, data.cities);
+            clearTimeout(resyncTimer);
+            resyncTimer = setTimeout(() => loadSchedule(Object.keys(schedule)), data.resync_after * 1000);
+            tick();
+        })
+        .catch(error => console.error('Error:', error));
+}
+
+function localTime(entry, nowMs) {
+    const next = entry.next_transition;
+    const offset = next && nowMs >= next.at * 1000 ? next.offset : entry.offset;
+    return {date: new Date(nowMs + offset * 1000), offset};
+}
+
+// Same boundaries as get_time_of_day() on the server
+function timeOfDay(hour) {
+    if (hour >= 6 && hour < 12) return 'Morning';
+    if (hour >= 12 && hour < 18) return 'Day';
+    if (hour >= 18 && hour < 22) return 'Evening';
+    return 'Night';
+}
+
+function formatOffset(offset) {
+    const minutes = Math.abs(offset) / 60;
+    return `${offset < 0 ? '-' : '+'}${pad(Math.floor(minutes / 60))}${pad(minutes % 60)}`;
+}
+
+function renderClocks(nowMs) {
+    Object.entries(schedule).forEach(([city, entry]) => {
+        const {date, offset} = localTime(entry, nowMs);
+        const clock = `${pad(date.getUTCHours())}:${pad(date.getUTCMinutes())}:${pad(date.getUTCSeconds())}`;
+        if (city === currentMainCity) {
+            document.getElementById('mainTime').textContent = clock;
+            document.querySelector('.main-date').textContent =
+                `${DAYS[date.getUTCDay()]}, ${MONTHS[date.getUTCMonth()]} ${pad(date.getUTCDate())} ${date.getUTCFullYear()}`;
+        }
+        document.querySelectorAll('.city-card[data-city]').forEach(card => {
+            if (card.dataset.city !== city) return;
+            card.querySelector('.city-time').textContent = clock;
+            const period = timeOfDay(date.getUTCHours());
+            const timeOfDayLabel = card.querySelector('.city-time-of-day');
+            timeOfDayLabel.className = `city-time-of-day ${period.toLowerCase()}`;
+            timeOfDayLabel.textContent = period;
+            card.querySelector('.utc-offset').textContent = `UTC${formatOffset(offset)}`;
+        });
+    });
+}
+
+function tick() {
+    clearTimeout(tickTimer);
+    const nowMs = Date.now() + skewMs;
+    renderClocks(nowMs);
+    // Wake just after the next whole second of server time
+    tickTimer = setTimeout(tick, 1000 - (nowMs % 1000) + 5);
+}
+
+function setTheme(theme) {
+    document.body.className = ''; 
+    if (theme !== 'dark') {
+       document.body.classList.add(theme + '-theme');
+    }
+
+    document.querySelectorAll('.theme-btn').forEach(btn => btn.classList.remove('active'));
+    event.target.classList.add('active');
+}
+
+function toggleFormat(format) {
+    currentFormat = format;
+    document.querySelectorAll('.format-btn').forEach(btn => btn.classList.remove('active'));
+    event.target.classList.add('active');
+}
+
+function saveDashboard() {
+    return fetch('/api/dashboard', {
+        method: 'PUT',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({main_city: currentMainCity, cities: dashboardCities}),
+    })
+        .then(response => response.json())
+        .catch(error => console.error('Error:', error));
+}
+
+function setMainCity(city) {
+    if (city !== currentMainCity) {
+        currentMainCity = city;
+        saveDashboard();
+    }
+    const show = () => {
+        const entry = schedule[city];
+        if (!entry) return;
+        document.querySelector('.main-location').textContent = `${city}, ${entry.country || ''}`;
+        document.querySelectorAll('.city-card').forEach(card => {
+            card.classList.toggle('featured', card.dataset.city === city);
+        });
+        tick();
+    };
+    if (city in schedule) {
+        show();
+    } else {
+        loadSchedule([...Object.keys(schedule), city]).then(show);
+    }
+}
+
+function startAddCity() {
+    addingCity = true;
+    document.getElementById('searchInput').focus();
+}
+
+function addCityCard(city) {
+    const card = document.createElement('div');
+    card.className = 'city-card';
+    card.dataset.city = city;
+    card.onclick = () => setMainCity(city);
+    card.innerHTML = `
+        <div class="city-time"></div>
+        <div class="city-name"></div>
+        <div class="city-country"></div>
+        <div class="city-time-of-day"></div>
+        <br>
+        <span class="utc-offset"></span>`;
+    card.querySelector('.city-name').textContent = city;
+    document.querySelector('.cities-grid').insertBefore(card, document.querySelector('.add-city'));
+    return card;
+}
+
+function addCity(city) {
+    if (dashboardCities.includes(city)) return;
+    dashboardCities = [...dashboardCities, city];
+    const card = addCityCard(city);
+    saveDashboard();
+    loadSchedule([...Object.keys(schedule), city]).then(() => {
+        card.querySelector('.city-country').textContent = (schedule[city] || {}).country || '';
+    });
+}
+
+function renderSearchResults(results) {
+    const list = document.getElementById('searchResults');
+    list.innerHTML = '';
+    results.forEach(result => {
+        const item = document.createElement('li');
+        item.textContent = `${result.city}, ${result.country}`;
+        // mousedown fires before the input's blur clears the list
+        item.addEventListener('mousedown', () => {
+            if (addingCity) {
+                addCity(result.city);
+            } else {
+                setMainCity(result.city);
+            }
+            document.getElementById('searchInput').value = '';
+            renderSearchResults([]);
+        });
+        list.appendChild(item);
+    });
+}
+
+let searchTimer;
+const searchInput = document.getElementById('searchInput');
+searchInput.addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    const query = searchInput.value.trim();
+    if (!query) {
+        renderSearchResults([]);
+        return;
+    }
+    searchTimer = setTimeout(() => {
+        fetch(`/api/search?q=${encodeURIComponent(query)}&limit=8`)
+            .then(response => response.json())
+            .then(data => renderSearchResults(data.results))
+            .catch(error => console.error('Error:', error));
+    }, 150);
+});
+searchInput.addEventListener('blur', () => {
+    renderSearchResults([]);
+    addingCity = false;
+});
+
+const pageCities = new Set([currentMainCity]);
+document.querySelectorAll('.city-card[data-city]').forEach(card => pageCities.add(card.dataset.city));
+loadSchedule([...pageCities]);
@@ -0,0 +1,137 @@
+"""Vectorized sunrise/sunset engine with per-(city, local date) memoization"""
+import numpy as np
+from cache import LRUCache
+import zones
+
+# Julian date of the Unix epoch and of the J2000.0 epoch
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+
+# Sun's apparent radius plus atmospheric refraction, as a solar altitude
+SUNRISE_ALTITUDE = np.radians(-0.833)
+AXIAL_TILT = np.radians(23.4397)
+
+NO_EVENT = {"sunrise": "--:--", "sunset": "--:--"}
+
+
+def solar_events(lat, lon, day):
+    """Sunrise and sunset instants for local calendar days (days since 1970-01-01).
+
+    All arguments broadcast against each other, so a column of city
+    coordinates against a row of days computes the whole table in one call.
+    Returns (sunrise, sunset, daylight) in epoch seconds / seconds; sunrise
+    and sunset are NaN when the sun does not cross the horizon that day.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.asarray(lon, dtype=np.float64)
+    day = np.asarray(day, dtype=np.float64)
+
+    # Mean solar time at the observer's longitude, in days since J2000.0
+    n = day + UNIX_EPOCH_JD + 0.5 - J2000_JD
+    mean_time = n + 0.0008 - lon / 360.0
+
+    anomaly = np.radians((357.5291 + 0.98560028 * mean_time) % 360.0)
+    center = 1.9148 * np.sin(anomaly) + 0.0200 * np.sin(2 * anomaly) + 0.0003 * np.sin(3 * anomaly)
+    ecliptic_lon = np.radians((np.degrees(anomaly) + center + 180.0 + 102.9372) % 360.0)
+    transit = J2000_JD + mean_time + 0.0053 * np.sin(anomaly) - 0.0069 * np.sin(2 * ecliptic_lon)
+
+    sin_declination = np.sin(ecliptic_lon) * np.sin(AXIAL_TILT)
+    cos_declination = np.cos(np.arcsin(sin_declination))
+    cos_hour_angle = (np.sin(SUNRISE_ALTITUDE) - np.sin(lat) * sin_declination) / (np.cos(lat) * cos_declination)
+
+    # cos > 1: the sun never rises (polar night); cos < -1: it never sets
+    hour_angle = np.degrees(np.arccos(np.clip(cos_hour_angle, -1.0, 1.0)))
+    daylight = hour_angle / 180.0 * 86400.0
+    crosses = np.abs(cos_hour_angle) <= 1.0
+    sunrise = np.where(crosses, (transit - hour_angle / 360.0 - UNIX_EPOCH_JD) * 86400.0, np.nan)
+    sunset = np.where(crosses, (transit + hour_angle / 360.0 - UNIX_EPOCH_JD) * 86400.0, np.nan)
+    return sunrise, sunset, daylight
+
+
+def format_duration(seconds):
+    minutes = int(round(seconds / 60.0))
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+def format_clock(ts, offset):
+    minutes = int((ts + offset) // 60) % 1440
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_events(zone, sunrise, sunset, daylight):
+    """Display entries for arrays of solar events, all in one zone"""
+    crosses = ~np.isnan(sunrise)
+    rise_offsets = zone.offsets_at(np.where(crosses, sunrise, 0))
+    set_offsets = zone.offsets_at(np.where(crosses, sunset, 0))
+    entries = []
+    for i in range(len(sunrise)):
+        if crosses[i]:
+            entry = {
+                "sunrise": format_clock(sunrise[i], rise_offsets[i]),
+                "sunset": format_clock(sunset[i], set_offsets[i]),
+            }
+        else:
+            entry = dict(NO_EVENT)
+        entry["duration"] = format_duration(daylight[i])
+        entries.append(entry)
+    return entries
+
+
+class SunCalendar:
+    """Sunrise/sunset lookups for a table of cities, memoized per local date"""
+
+    def __init__(self, cities, maxsize=100000):
+        self.cities = cities
+        self.memo = LRUCache(maxsize=maxsize, name="sun_times")
+
+    def get(self, city_name, day):
+        """Formatted sunrise, sunset and daylight duration for a city's local day"""
+        return self.memo.get_or_compute((city_name, day), lambda: self.precompute([city_name], day, 1)[city_name][0])
+
+    def precompute(self, city_names, first_day, days):
+        """Compute `days` consecutive local dates for many cities in one vectorized pass.
+
+        Every result is stored in the memo; returns {city: [entry per day]}.
+        """
+        city_names = [name for name in city_names if name in self.cities]
+        lat = np.array([self.cities[name]["lat"] for name in city_names])[:, None]
+        lon = np.array([self.cities[name]["lon"] for name in city_names])[:, None]
+        day_range = np.arange(first_day, first_day + days)[None, :]
+        sunrise, sunset, daylight = solar_events(lat, lon, day_range)
+
+        results = {}
+        for row, name in enumerate(city_names):
+            zone = zones.get_zone(self.cities[name]["timezone"])
+            entries = format_events(zone, sunrise[row], sunset[row], daylight[row])
+            for col, entry in enumerate(entries):
+                self.memo.put((name, first_day + col), entry)
+            results[name] = entries
+        return results
+
+    def get_many(self, pairs):
+        """get() for many (city, day) pairs; every miss is computed in one vectorized pass"""
+        entries = [self.memo.get(pair) for pair in pairs]
+        missing = list(dict.fromkeys(pair for pair, entry in zip(pairs, entries) if entry is None))
+        if missing:
+            records = {name: self.cities[name] for name in {name for name, _day in missing}}
+            lat = np.array([records[name]["lat"] for name, _day in missing])
+            lon = np.array([records[name]["lon"] for name, _day in missing])
+            sunrise, sunset, daylight = solar_events(lat, lon, np.array([day for _name, day in missing]))
+
+            rows_by_zone = {}
+            for row, (name, _day) in enumerate(missing):
+                rows_by_zone.setdefault(records[name]["timezone"], []).append(row)
+            computed = {}
+            for zone_name, rows in rows_by_zone.items():
+                zone_entries = format_events(zones.get_zone(zone_name), sunrise[rows], sunset[rows], daylight[rows])
+                for row, entry in zip(rows, zone_entries):
+                    computed[missing[row]] = entry
+                    self.memo.put(missing[row], entry)
+            entries = [entry if entry is not None else computed[pair] for pair, entry in zip(pairs, entries)]
+        return entries
+
+    def precompute_year(self, year, city_names=None):
+        """Fill the memo with a whole calendar year for every city (or the given ones)"""
+        first_day = int(np.datetime64(f"{year}-01-01", "D").astype(np.int64))
+        days = int(np.datetime64(f"{year + 1}-01-01", "D").astype(np.int64)) - first_day
+        return self.precompute(list(self.cities) if city_names is None else city_names, first_day, days)
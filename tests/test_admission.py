@@ -0,0 +1,257 @@
+"""Token buckets and the admission middleware in front of a small Flask app"""
+from collections import Counter
+import http.client
+import logging
+import multiprocessing
+import threading
+import time
+from flask import Flask, Response
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import make_server
+import pytest
+from admission import Admission, TokenBuckets, parse_limits, parse_stream_caps
+
+
+def test_parse_limits():
+    assert parse_limits("api=20:40,cities=2") == {"api": (20.0, 40.0), "cities": (2.0, 2.0)}
+    assert parse_limits("off") == parse_limits("") == {}
+    assert parse_stream_caps("4:2") == (4, 2)
+    assert parse_stream_caps("0") == (0, 0)
+
+
+def test_bucket_burst_then_refill():
+    buckets = TokenBuckets(rate=2, burst=3)
+    assert [buckets.take("a", now=100) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a", now=100) == pytest.approx(0.5)
+    # A quarter second refills half a token: still short by half
+    assert buckets.take("a", now=100.25) == pytest.approx(0.25)
+    assert buckets.take("a", now=100.5) == 0
+    # Other clients have buckets of their own
+    assert buckets.take("b", now=100.5) == 0
+
+
+def test_bucket_never_exceeds_burst():
+    buckets = TokenBuckets(rate=10, burst=2)
+    buckets.take("a", now=0)
+    results = [buckets.take("a", now=3600) for _ in range(3)]
+    assert results[:2] == [0, 0] and results[2] > 0
+
+
+def test_bucket_evicts_least_recently_seen_per_shard():
+    buckets = TokenBuckets(rate=1, burst=1, shards=1, max_keys=2)
+    buckets.take("a", now=0)
+    buckets.take("b", now=0)
+    # Seeing "a" again makes "b" the oldest, so "c" pushes "b" out
+    assert buckets.take("a", now=0) > 0
+    buckets.take("c", now=0)
+    assert buckets.take("b", now=0) == 0
+    # ...and "b" coming back pushes out "a", leaving "c" known
+    assert buckets.take("c", now=0) > 0
+    assert buckets.take("a", now=0) == 0
+
+
+def make_app(admission):
+    app = Flask(__name__)
+
+    @app.route("/api/time")
+    def time_api():
+        return {"ok": True}
+
+    @app.route("/api/search")
+    def search_api():
+        return {"ok": True}
+
+    @app.route("/api/work")
+    def work_api():
+        # A few milliseconds of CPU, like a route that computes its answer
+        deadline = time.perf_counter() + 0.005
+        while time.perf_counter() < deadline:
+            pass
+        return {"ok": True}
+
+    @app.route("/api/stream")
+    def stream_api():
+        def events():
+            while True:
+                yield ": keepalive\n\n"
+        return Response(events(), mimetype="text/event-stream")
+
+    @app.route("/metrics")
+    def metrics():
+        return "ok"
+
+    admission.init_app(app)
+    return app
+
+
+def get(client, path, address="10.0.0.1", buffered=True):
+    """A response read in full, or with buffered=False one whose body is
+    still open, as a slow client's would be"""
+    return client.get(path, environ_base={"REMOTE_ADDR": address}, buffered=buffered)
+
+
+def test_rate_limit_answers_429_with_retry_after():
+    admission = Admission(limits={"api": (0.1, 2)}, max_concurrent=0, max_streams=0, max_client_streams=0)
+    client = make_app(admission).test_client()
+    assert [get(client, "/api/time").status_code for _ in range(2)] == [200, 200]
+    response = get(client, "/api/time")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    assert response.json == {"error": "Too many requests"}
+    assert get(client, "/api/time", address="10.0.0.2").status_code == 200
+    assert get(client, "/metrics").status_code == 200
+    assert admission.refused["rate_limited"] == 1
+
+
+def test_concurrency_cap_sheds_and_close_releases_the_slot():
+    admission = Admission(limits={}, max_concurrent=1, max_streams=0, max_client_streams=0)
+    client = make_app(admission).test_client()
+    held = get(client, "/api/time", buffered=False)
+    assert held.status_code == 200 and admission.in_flight == 1
+    response = get(client, "/api/time")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # The metrics scrape gets through a full server
+    assert get(client, "/metrics").status_code == 200
+    held.close()
+    assert admission.in_flight == 0
+    assert get(client, "/api/time").status_code == 200
+    assert admission.in_flight == 0
+    assert admission.refused["shed"] == 1
+
+
+def test_stream_caps():
+    admission = Admission(limits={}, max_concurrent=1, max_streams=2, max_client_streams=1)
+    client = make_app(admission).test_client()
+    first = get(client, "/api/stream", buffered=False)
+    assert first.status_code == 200
+    # Streams do not count against the request cap
+    assert get(client, "/api/time").status_code == 200
+    again = get(client, "/api/stream", buffered=False)
+    assert again.status_code == 429 and again.headers["Retry-After"] == "5"
+    second = get(client, "/api/stream", address="10.0.0.2", buffered=False)
+    assert second.status_code == 200
+    full = get(client, "/api/stream", address="10.0.0.3", buffered=False)
+    assert full.status_code == 503
+    first.close()
+    assert admission.streams == 1
+    third = get(client, "/api/stream", address="10.0.0.3", buffered=False)
+    assert third.status_code == 200
+    second.close()
+    third.close()
+    assert admission.streams == 0 and admission._client_streams == {}
+    assert admission.refused["streams"] == 2
+
+
+def test_suspended_admits_everything_then_starts_full():
+    admission = Admission(limits={"api": (0.1, 1)}, max_concurrent=0, max_streams=0, max_client_streams=0)
+    client = make_app(admission).test_client()
+    with admission.suspended():
+        assert [get(client, "/api/time").status_code for _ in range(3)] == [200, 200, 200]
+    assert get(client, "/api/time").status_code == 200
+    assert get(client, "/api/time").status_code == 429
+
+
+def test_forwarded_clients_get_their_own_buckets():
+    admission = Admission(limits={"api": (0.1, 1)}, max_concurrent=0, max_streams=0, max_client_streams=0)
+    app = make_app(admission)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    client = app.test_client()
+
+    def forwarded(address):
+        return client.get("/api/time", headers={"X-Forwarded-For": address},
+                          environ_base={"REMOTE_ADDR": "10.1.1.1"}, buffered=True).status_code
+
+    assert forwarded("203.0.113.1") == 200
+    assert forwarded("203.0.113.2") == 200
+    assert forwarded("203.0.113.1") == 429
+
+
+def test_each_route_has_its_own_bucket():
+    admission = Admission(limits={"api": (0.1, 1), "search": (0.1, 2)}, max_concurrent=0, max_streams=0,
+                          max_client_streams=0)
+    client = make_app(admission).test_client()
+    assert get(client, "/api/time").status_code == 200
+    assert get(client, "/api/time").status_code == 429
+    # /api/work has the "api" limit in a bucket of its own
+    assert get(client, "/api/work").status_code == 200
+    # /api/search has a limit of its own
+    assert [get(client, "/api/search").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_unknown_routes_share_one_bucket():
+    admission = Admission(limits={"api": (0.1, 1)}, max_concurrent=0, max_streams=0, max_client_streams=0)
+    client = make_app(admission).test_client()
+    assert get(client, "/api/nothing-1").status_code == 404
+    assert get(client, "/api/nothing-2").status_code == 429
+    assert get(client, "/api/time").status_code == 200
+
+
+def request_loop(port, source, path, deadline, statuses, latencies=None, interval=0):
+    """Send requests from source until deadline: back to back, or one every interval seconds"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10, source_address=(source, 0))
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        time.sleep(max(0, next_at - time.perf_counter()))
+        start = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        if latencies is not None:
+            latencies.append(time.perf_counter() - start)
+        statuses[response.status] += 1
+        next_at = max(next_at + interval, time.perf_counter()) if interval else time.perf_counter()
+    conn.close()
+
+
+def abuse(port, seconds, results):
+    """Child process: abusive clients on another loopback address, sending
+    requests back to back, in an interpreter of their own so that they take
+    no GIL time from the server"""
+    statuses = Counter()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=request_loop, args=(port, "127.0.0.2", "/api/work", deadline, statuses))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(dict(statuses))
+
+
+def paced_p99(admission, seconds=2):
+    """(paced clients' statuses, their p99 in seconds, abusive statuses) against a threaded server"""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, make_app(admission), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    abusers = context.Process(target=abuse, args=(server.server_port, seconds + 0.5, results))
+    statuses, latencies = Counter(), []
+    try:
+        abusers.start()
+        time.sleep(0.5)  # let the abusers saturate the server
+        deadline = time.perf_counter() + seconds
+        paced = [threading.Thread(target=request_loop, args=(server.server_port, "127.0.0.1", "/api/work", deadline,
+                                                              statuses, latencies, 0.1))
+                 for _ in range(2)]
+        for thread in paced:
+            thread.start()
+        for thread in paced:
+            thread.join()
+        abusive = results.get(timeout=30)
+        abusers.join()
+    finally:
+        server.shutdown()
+    latencies.sort()
+    return statuses, latencies[int(len(latencies) * 0.99)], abusive
+
+
+def test_paced_clients_stay_fast_under_overload():
+    admission = Admission(limits={"api": (20, 40)}, max_concurrent=4, max_streams=0, max_client_streams=0)
+    statuses, p99, abusive = paced_p99(admission)
+    assert abusive.get(429, 0) > abusive.get(200, 0)
+    assert set(statuses) == {200}
+    # Generous, for slow and shared hosts: unprotected, each paced request
+    # queues behind every abusive one in flight
+    assert p99 < 0.25, f"paced p99 {p99 * 1000:.1f} ms"
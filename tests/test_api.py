@@ -0,0 +1,84 @@
+"""Request validation at the HTTP routes, through Flask's test client"""
+import os
+import pytest
+from dashboards import COOKIE, cookie_value, new_user_id
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # Set before app is imported: its admission control reads them once
+    os.environ.setdefault("TIMESPOT_DB", str(tmp_path_factory.mktemp("db") / "dashboards.sqlite3"))
+    os.environ["TIMESPOT_RATE_LIMITS"] = "off"
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize("at", ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"])
+def test_time_at_outside_the_calendar_is_a_400(client, at):
+    response = client.get("/api/time/London", query_string={"at": at})
+    assert response.status_code == 400
+    assert "out of range" in response.json["error"]
+
+
+def test_bulk_time_reports_out_of_range_instants_per_query(client):
+    response = client.post("/api/time", json={"queries": [
+        {"city": "London", "at": "9999-12-31T23:59:59-05:00"},
+        {"city": "Los Angeles", "at": "9999-12-31T23:00:00"},
+        {"city": "London", "at": "2026-03-29T00:30:00Z"},
+    ]})
+    assert response.status_code == 200
+    first, second, third = response.json["results"]
+    assert "out of range" in first["error"] and "out of range" in second["error"]
+    assert third["at"] == "2026-03-29T00:30:00+00:00"
+
+
+@pytest.mark.parametrize("body", [b"[]", b"0", b"false", b'""', b"", b"{", b"[1, 2]", b'"London"', b'{"cities": []}'])
+def test_times_post_needs_an_object_with_cities(client, body):
+    response = client.post("/api/times", data=body, content_type="application/json")
+    assert response.status_code == 400
+
+
+def test_times_post(client):
+    response = client.post("/api/times", json={"cities": ["London", "Atlantis"]})
+    assert list(response.json["cities"]) == ["London"]
+    assert response.json["not_found"] == ["Atlantis"]
+    # Without cities, every city
+    assert len(client.post("/api/times", json={}).json["cities"]) > 1
+
+
+@pytest.mark.parametrize("path", ["/api/overlap", "/api/transitions"])
+@pytest.mark.parametrize("dates", [{"from": "9999-12-31"}, {"from": "0001-01-01", "to": "0001-01-02"},
+                                   {"from": "2100-12-30"}, {"from": "1899-12-31", "to": "1900-01-01"}])
+def test_date_ranges_stay_inside_the_zone_tables(client, path, dates):
+    response = client.get(path, query_string=dict(dates, cities="London", start="23:00", end="01:00"))
+    assert response.status_code == 400
+    assert response.json["error"] == "from and to must be between 1900-01-01 and 2100-12-31"
+
+
+@pytest.mark.parametrize("path", ["/api/overlap", "/api/transitions"])
+def test_date_ranges_at_the_edges(client, path):
+    response = client.get(path, query_string={"cities": "London", "from": "2100-12-25", "to": "2100-12-31"})
+    assert response.status_code == 200
+    assert (response.json["from"], response.json["to"]) == ("2100-12-25", "2100-12-31")
+
+
+@pytest.mark.parametrize("main_city, cities, shown", [
+    ("Atlantis", ["Atlantis", "Tokyo"], "Karachi"),
+    ("Tokyo", ["Atlantis", "Tokyo"], "Tokyo"),
+])
+def test_dashboards_with_cities_gone_from_the_registry(client, main_city, cities, shown):
+    import app  # after the client fixture has configured it
+    user_id = new_user_id()
+    dashboard = app.dashboard_store.save(user_id, main_city, cities)
+    client.set_cookie(COOKIE, cookie_value(user_id, dashboard.version))
+    try:
+        page = client.get("/")
+        assert page.status_code == 200
+        assert "Atlantis" not in page.get_data(as_text=True)
+        assert f"{shown}," in page.get_data(as_text=True)
+        # The cookie still names the saved dashboard
+        assert "Set-Cookie" not in page.headers
+        saved = client.get("/api/dashboard").json
+        assert saved["main_city"] == shown and "Atlantis" not in saved["cities"]
+    finally:
+        client.delete_cookie(COOKIE)
@@ -0,0 +1,34 @@
+"""Pre-encoded payloads: content negotiation and conditional requests"""
+from flask import Flask, request
+from payload import Payload
+
+BODY = b'{"cities":' + b'"London",' * 500 + b'"Tokyo"}\n'
+
+
+def make_client():
+    app = Flask(__name__)
+    payload = Payload(BODY)
+
+    @app.route("/")
+    def index():
+        return payload.response(request)
+
+    return app.test_client(), payload
+
+
+def test_each_encoding_has_its_own_etag():
+    client, payload = make_client()
+    plain = client.get("/")
+    gzipped = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert plain.data == BODY and gzipped.headers["Content-Encoding"] == "gzip"
+    assert plain.headers["ETag"] == f'"{payload.etag}"'
+    assert gzipped.headers["ETag"] == f'"{payload.etag}-gzip"'
+
+
+def test_if_none_match_compares_weakly_against_every_encoding():
+    client, payload = make_client()
+    for tag in (f'"{payload.etag}"', f'W/"{payload.etag}"', f'W/"{payload.etag}-gzip"', f'"x", "{payload.etag}-gzip"', "*"):
+        response = client.get("/", headers={"If-None-Match": tag, "Accept-Encoding": "gzip"})
+        assert response.status_code == 304, tag
+        assert response.data == b""
+    assert client.get("/", headers={"If-None-Match": '"other"'}).status_code == 200
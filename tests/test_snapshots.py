@@ -0,0 +1,42 @@
+"""Reads of the shared snapshot table that span a publish"""
+import pytest
+import app
+
+SECOND = 1_800_000_000
+
+
+@pytest.fixture
+def published(monkeypatch):
+    """Serve get_times_now() from the table, with each read's second taken
+    from the returned list and any fallback to get_times_for() recorded"""
+    seconds = []
+    fallbacks = []
+    real_read = app.SnapshotView.read
+
+    def read(view, city):
+        record = real_read(view, city)
+        return (seconds.pop(0), *record[1:])
+
+    def get_times_for(cities, ts):
+        fallbacks.append((cities, ts))
+        return {}
+
+    monkeypatch.setattr(app.ticker, "snapshot", lambda second: app.SnapshotView(app.snapshot_table))
+    monkeypatch.setattr(app.SnapshotView, "read", read)
+    monkeypatch.setattr(app, "get_times_for", get_times_for)
+    return seconds, fallbacks
+
+
+def test_get_times_now_reads_one_second(published):
+    seconds, fallbacks = published
+    seconds.extend([SECOND, SECOND])
+    assert list(app.get_times_now(["London", "Tokyo"], SECOND + 0.5)) == ["London", "Tokyo"]
+    assert fallbacks == []
+
+
+def test_get_times_now_never_mixes_seconds(published):
+    seconds, fallbacks = published
+    # The ticker publishes the next second after London is read
+    seconds.extend([SECOND, SECOND + 1])
+    assert app.get_times_now(["London", "Tokyo"], SECOND + 0.5) == {}
+    assert fallbacks == [(["London", "Tokyo"], SECOND + 0.5)]
@@ -0,0 +1,71 @@
+"""Transition tables against the timezone libraries they are built from"""
+from datetime import datetime
+import calendar
+import zoneinfo
+import numpy as np
+import pytest
+from cities import open_registry
+import zones
+
+ZONE_NAMES = sorted(set(open_registry().zone_names))
+
+
+def load(name):
+    try:
+        return zones.BACKENDS[name]()
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+
+@pytest.mark.parametrize("backend_name", sorted(zones.BACKENDS))
+def test_tables_match_backend(backend_name):
+    assert zones.verify(ZONE_NAMES, load(backend_name)) == []
+
+
+def test_zoneinfo_tables_match_pytz():
+    zoneinfo, pytz = load("zoneinfo"), load("pytz")
+    start, end = calendar.timegm((2000, 1, 1, 0, 0, 0)), calendar.timegm((2031, 1, 1, 0, 0, 0))
+    mismatches = []
+    for name in ZONE_NAMES:
+        tables = [zones.build_zone_table(name, backend) for backend in (zoneinfo, pytz)]
+        edges = [t + d for table in tables for t in table.transitions if start <= t < end for d in (-1, 0)]
+        instants = np.union1d(np.arange(start, end, 3600), edges)
+        offsets = [table.offsets_at(instants) for table in tables]
+        abbreviations = [np.array(table.abbreviations)[table.indexes_at(instants)] for table in tables]
+        differ = (offsets[0] != offsets[1]) | (abbreviations[0] != abbreviations[1])
+        mismatches.extend((name, int(ts)) for ts in instants[differ][:5])
+    assert mismatches == []
+
+
+def test_parse_rule():
+    rule = zones.parse_rule("EST5EDT,M3.2.0,M11.1.0")
+    assert rule == ("EST", -18000, "EDT", -14400, ((3, 2, 0), 7200), ((11, 1, 0), 7200))
+    assert zones.parse_rule("<+0330>-3:30") == ("+0330", 12600, None, None, None, None)
+    rule = zones.parse_rule("<-03>3<-02>,M3.5.0/-2,M10.5.0/-1")
+    assert (rule.start[1], rule.end[1]) == (-7200, -3600)
+    with pytest.raises(ValueError):
+        zones.parse_rule("EST5EDT")
+
+
+def test_rule_instant():
+    # Second Sunday of March 2024, 02:00
+    assert zones.rule_instant(((3, 2, 0), 7200), 2024) == calendar.timegm((2024, 3, 10, 2, 0, 0))
+    # Last Sunday of October 2024
+    assert zones.rule_instant(((10, 5, 0), 3600), 2024) == calendar.timegm((2024, 10, 27, 1, 0, 0))
+    # J60 is Mar 1 even in leap years; 59 counts Feb 29
+    assert zones.rule_instant(((True, 60), 0), 2024) == calendar.timegm((2024, 3, 1, 0, 0, 0))
+    assert zones.rule_instant(((False, 59), 0), 2024) == calendar.timegm((2024, 2, 29, 0, 0, 0))
+
+
+def test_zoneinfo_tables_match_zoneinfo_everywhere():
+    backend = load("zoneinfo")
+    instants = range(calendar.timegm((1971, 1, 1, 0, 0, 0)), calendar.timegm((2040, 1, 1, 0, 0, 0)), 30 * 86400)
+    mismatches = []
+    for name in sorted(zoneinfo.available_timezones()):
+        table = zones.build_zone_table(name, backend)
+        tz = backend.tzinfo(name)
+        for ts in instants:
+            if table.offset(ts) != int(datetime.fromtimestamp(ts, tz).utcoffset().total_seconds()):
+                mismatches.append((name, ts))
+                break
+    assert mismatches == []
@@ -0,0 +1,448 @@
+"""Precomputed UTC-offset transition tables for fast UTC -> local time conversion.
+
+The tables are read through a pluggable backend: the stdlib zoneinfo
+database by default, or pytz where zoneinfo has no data (or when
+TIMESPOT_TZ_BACKEND=pytz). Each zone's table is built on first use and cached.
+"""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+from importlib import resources
+import calendar
+import os
+import re
+import struct
+import time
+import numpy as np
+
+# Tables extend a zone's recurring DST rule up to the end of this year
+LAST_RULE_YEAR = 2100
+
+class LocalTime(namedtuple("LocalTime", ["ts", "offset", "abbreviation", "tm"])):
+    """A localized instant: epoch seconds, UTC offset in seconds, zone abbreviation
+    and the local wall-clock fields as a time.struct_time"""
+
+    __slots__ = ()
+
+    @property
+    def hour(self):
+        return self.tm.tm_hour
+
+    @property
+    def month(self):
+        return self.tm.tm_mon
+
+    @property
+    def day(self):
+        """Local calendar date as days since 1970-01-01"""
+        return (int(self.ts // 1) + self.offset) // 86400
+
+    def strftime(self, fmt):
+        return time.strftime(fmt, self.tm)
+
+
+class ZoneTable:
+    """Sorted UTC transition instants with the offset and abbreviation in force from each"""
+
+    __slots__ = ("name", "transitions", "offsets", "abbreviations", "_arrays")
+
+    def __init__(self, name, transitions, offsets, abbreviations):
+        self.name = name
+        self.transitions = transitions
+        self.offsets = offsets
+        self.abbreviations = abbreviations
+        self._arrays = None
+
+    def index(self, ts):
+        return max(bisect_right(self.transitions, ts) - 1, 0)
+
+    def offset(self, ts):
+        return self.offsets[self.index(ts)]
+
+    def indexes_at(self, ts):
+        """Vectorized index() for an array of epoch instants"""
+        if self._arrays is None:
+            self._arrays = (np.array(self.transitions, dtype=np.int64), np.array(self.offsets, dtype=np.int64))
+        return np.maximum(np.searchsorted(self._arrays[0], ts, side="right") - 1, 0)
+
+    def offsets_at(self, ts):
+        """Vectorized offset lookup for an array of epoch instants"""
+        index = self.indexes_at(ts)
+        return self._arrays[1][index]
+
+    def localize(self, ts):
+        i = self.index(ts)
+        offset = self.offsets[i]
+        return LocalTime(ts, offset, self.abbreviations[i], time.gmtime(int(ts // 1) + offset))
+
+    def next_transition(self, ts):
+        """The first transition strictly after ts as (instant, offset, abbreviation), or None"""
+        i = bisect_right(self.transitions, ts)
+        if i == len(self.transitions):
+            return None
+        return self.transitions[i], self.offsets[i], self.abbreviations[i]
+
+
+FIRST_INSTANT = calendar.timegm(datetime.min.timetuple())
+
+
+def _read(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated TZif file")
+    return data
+
+
+_TZIF_HEADER = struct.Struct(">4sc15x6l")
+
+
+def read_tzif(f):
+    """(transition instants, local time type index of each, then each type's
+    UTC offset, DST flag and abbreviation, and the footer TZ rule or "")
+    from a TZif file (RFC 8536)"""
+    magic, version, *counts = _TZIF_HEADER.unpack(_read(f, _TZIF_HEADER.size))
+    if magic != b"TZif":
+        raise ValueError("not a TZif file")
+    time_format = "l"
+    if version != b"\0":
+        # Version 2+ files repeat the data with 64-bit instants after the
+        # 32-bit version 1 block, followed by the footer; skip to those
+        isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = counts
+        _read(f, timecnt * 5 + typecnt * 6 + charcnt + leapcnt * 8 + isstdcnt + isutcnt)
+        magic, version, *counts = _TZIF_HEADER.unpack(_read(f, _TZIF_HEADER.size))
+        if magic != b"TZif":
+            raise ValueError("not a TZif file")
+        time_format = "q"
+    isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = counts
+    time_size = struct.calcsize(time_format)
+
+    transitions = list(struct.unpack(f">{timecnt}{time_format}", _read(f, timecnt * time_size)))
+    indexes = list(_read(f, timecnt))
+    types = [struct.unpack(">lBB", _read(f, 6)) for _ in range(typecnt)]
+    chars = _read(f, charcnt)
+    _read(f, leapcnt * (time_size + 4) + isstdcnt + isutcnt)
+
+    offsets = [offset for offset, _isdst, _abbr in types]
+    isdst = [flag for _offset, flag, _abbr in types]
+    abbreviations = [chars[i:chars.index(b"\0", i)].decode("ascii") for _offset, _isdst, i in types]
+    rule = ""
+    if time_format == "q":
+        # The footer is the TZ rule between two newlines
+        footer = f.read().split(b"\n")
+        rule = footer[1].decode("ascii") if len(footer) > 2 else ""
+    return transitions, indexes, offsets, isdst, abbreviations, rule
+
+
+PosixRule = namedtuple("PosixRule", ["std", "std_offset", "dst", "dst_offset", "start", "end"])
+
+_TZ_NAME = r"[^<0-9:.,+-]+|<[A-Za-z0-9+-]+>"
+_TZ_TIME = r"[+-]?\d{1,3}(?::\d{2}(?::\d{2})?)?"
+_TZ_DATE = r"J\d{1,3}|\d{1,3}|M\d{1,2}\.\d\.\d"
+_TZ_RULE = re.compile(
+    rf"({_TZ_NAME})({_TZ_TIME})(?:({_TZ_NAME})({_TZ_TIME})?,({_TZ_DATE})(?:/({_TZ_TIME}))?,({_TZ_DATE})(?:/({_TZ_TIME}))?)?",
+    re.ASCII,
+)
+
+
+def _seconds(value):
+    sign = -1 if value[0] == "-" else 1
+    parts = [int(part) for part in value.lstrip("+-").split(":")]
+    return sign * sum(part * unit for part, unit in zip(parts, (3600, 60, 1)))
+
+
+def _rule_date(value):
+    if value[0] == "M":
+        return tuple(int(part) for part in value[1:].split("."))
+    # Julian days count from 1 and never include Feb 29; plain day numbers
+    # count from 0 and do
+    return (value[0] == "J", int(value.lstrip("J")))
+
+
+def parse_rule(value):
+    """A POSIX TZ rule (e.g. "EST5EDT,M3.2.0,M11.1.0") as a PosixRule of UTC
+    offsets in seconds, with each change as (date, local time); the changes
+    are None for zones without DST"""
+    match = _TZ_RULE.fullmatch(value)
+    if match is None:
+        raise ValueError(f"unsupported TZ rule: {value!r}")
+    std, std_offset, dst, dst_offset, start, start_time, end, end_time = match.groups()
+    # POSIX offsets count west of Greenwich
+    std_offset = -_seconds(std_offset)
+    if dst is None:
+        return PosixRule(std.strip("<>"), std_offset, None, None, None, None)
+    return PosixRule(
+        std.strip("<>"),
+        std_offset,
+        dst.strip("<>"),
+        std_offset + 3600 if dst_offset is None else -_seconds(dst_offset),
+        (_rule_date(start), 7200 if start_time is None else _seconds(start_time)),
+        (_rule_date(end), 7200 if end_time is None else _seconds(end_time)),
+    )
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def rule_instant(change, year):
+    """The local wall-clock time of a PosixRule change in year, as epoch seconds"""
+    when, at = change
+    if len(when) == 3:
+        # Mm.w.d: day d (0 is Sunday) of week w of month m, 5 being the last
+        month, week, weekday = when
+        first_weekday, days = calendar.monthrange(year, month)
+        day = (weekday - first_weekday - 1) % 7 + 1 + (week - 1) * 7
+        if day > days:
+            day -= 7
+        ordinal = date(year, month, day).toordinal()
+    else:
+        julian, n = when
+        ordinal = date(year, 1, 1).toordinal() + n
+        if julian:
+            ordinal -= 1 if n < 60 or not calendar.isleap(year) else 0
+    return (ordinal - EPOCH_ORDINAL) * 86400 + at
+
+
+class ZoneinfoBackend:
+    """Transitions read from the TZif files behind the stdlib zoneinfo module
+    (the system database on zoneinfo.TZPATH, else the tzdata package).
+
+    The files are parsed here: zoneinfo's own readers are private and change
+    between Python versions.
+    """
+
+    name = "zoneinfo"
+
+    def __init__(self):
+        import zoneinfo
+        self._zoneinfo = zoneinfo
+
+    def _open(self, name):
+        # Keys are relative paths inside the database, as ZoneInfo requires
+        if not name or os.path.isabs(name) or os.path.normpath(name) != name or name.startswith(".."):
+            raise ValueError(f"invalid zone name: {name!r}")
+        for root in self._zoneinfo.TZPATH:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                return open(path, "rb")
+        try:
+            return resources.files("tzdata").joinpath("zoneinfo", *name.split("/")).open("rb")
+        except (ImportError, OSError):
+            raise self._zoneinfo.ZoneInfoNotFoundError(f"No time zone found with key {name}") from None
+
+    def has_zone(self, name):
+        try:
+            with self._open(name) as f:
+                return f.read(4) == b"TZif"
+        except (OSError, ValueError, LookupError):
+            return False
+
+    def tzinfo(self, name):
+        return self._zoneinfo.ZoneInfo(name)
+
+    def transitions(self, name):
+        with self._open(name) as f:
+            trans_utc, trans_idx, utcoff, isdst, abbr, tz_str = read_tzif(f)
+
+        # Before its first transition a zone is in its first standard-time type
+        first = isdst.index(0) if 0 in isdst else 0
+        transitions = [FIRST_INSTANT] + trans_utc
+        offsets = [utcoff[first]] + [utcoff[i] for i in trans_idx]
+        abbreviations = [abbr[first]] + [abbr[i] for i in trans_idx]
+
+        # Past the last listed transition the footer's POSIX TZ rule applies;
+        # slim TZif files stop listing transitions as soon as it does
+        rule = parse_rule(tz_str) if tz_str else None
+        if rule is not None and rule.dst is not None:
+            last = transitions[-1]
+            for year in range(time.gmtime(max(last, 0)).tm_year, LAST_RULE_YEAR + 1):
+                for instant, offset, abbreviation in sorted([
+                    (rule_instant(rule.start, year) - rule.std_offset, rule.dst_offset, rule.dst),
+                    (rule_instant(rule.end, year) - rule.dst_offset, rule.std_offset, rule.std),
+                ]):
+                    if instant > last:
+                        transitions.append(instant)
+                        offsets.append(offset)
+                        abbreviations.append(abbreviation)
+        elif rule is not None and (rule.std_offset, rule.std) != (offsets[-1], abbreviations[-1]):
+            transitions.append(transitions[-1] + 1)
+            offsets.append(rule.std_offset)
+            abbreviations.append(rule.std)
+        return transitions, offsets, abbreviations
+
+
+class PytzBackend:
+    """Transitions taken from pytz's bundled database"""
+
+    name = "pytz"
+
+    def __init__(self):
+        import pytz
+        self._pytz = pytz
+
+    def has_zone(self, name):
+        return name in self._pytz.all_timezones_set
+
+    def tzinfo(self, name):
+        return self._pytz.timezone(name)
+
+    def transitions(self, name):
+        tz = self._pytz.timezone(name)
+        if hasattr(tz, "_utc_transition_times"):
+            transitions = [calendar.timegm(t.timetuple()) for t in tz._utc_transition_times]
+            offsets = [int(utcoffset.total_seconds()) for utcoffset, _dst, _abbr in tz._transition_info]
+            abbreviations = [abbr for _utcoffset, _dst, abbr in tz._transition_info]
+        else:
+            # Fixed-offset zones (UTC, Etc/GMT+5, ...) have a single entry
+            sample = datetime(2000, 1, 1)
+            transitions = [FIRST_INSTANT]
+            offsets = [int(tz.utcoffset(sample).total_seconds())]
+            abbreviations = [tz.tzname(sample)]
+        return transitions, offsets, abbreviations
+
+
+BACKENDS = {"zoneinfo": ZoneinfoBackend, "pytz": PytzBackend}
+
+
+def load_backend(name=None):
+    """The named backend (default: TIMESPOT_TZ_BACKEND, else zoneinfo), falling
+    back to pytz when zoneinfo is missing or has no timezone database"""
+    name = name or os.environ.get("TIMESPOT_TZ_BACKEND", "zoneinfo")
+    if name not in BACKENDS:
+        raise ValueError(f"unknown timezone backend: {name}")
+    if name == "zoneinfo":
+        try:
+            backend = ZoneinfoBackend()
+        except ImportError:
+            return PytzBackend()
+        return backend if backend.has_zone("UTC") else PytzBackend()
+    return BACKENDS[name]()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = load_backend()
+    return _backend
+
+
+def build_zone_table(name, backend=None):
+    return ZoneTable(name, *(backend or get_backend()).transitions(name))
+
+
+_tables = {}
+
+
+def get_zone(name):
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = build_zone_table(name)
+    return table
+
+
+class TransitionCalendar:
+    """Every offset change of a set of zones, merged into one time-ordered index"""
+
+    def __init__(self, names):
+        changes = []
+        for name in names:
+            table = get_zone(name)
+            for i in range(1, len(table.transitions)):
+                # Abbreviation-only and no-op entries do not move the clocks
+                if table.offsets[i] != table.offsets[i - 1]:
+                    changes.append((table.transitions[i], name, table.offsets[i - 1], table.offsets[i],
+                                    table.abbreviations[i]))
+        changes.sort()
+        self.changes = changes
+        self.instants = [change[0] for change in changes]
+
+    def __len__(self):
+        return len(self.changes)
+
+    def between(self, start, end):
+        """(instant, zone, offset before, offset after, abbreviation after) for changes in [start, end)"""
+        return self.changes[bisect_left(self.instants, start):bisect_left(self.instants, end)]
+
+
+@lru_cache(maxsize=4096)
+def is_zone(name):
+    return get_backend().has_zone(name)
+
+
+def preload(names):
+    """Build the tables for every zone in names ahead of the first request"""
+    for name in names:
+        get_zone(name)
+
+
+def localize(name, ts):
+    return get_zone(name).localize(ts)
+
+
+@lru_cache(maxsize=None)
+def format_offset(offset, separator=""):
+    """Render an offset in seconds the way strftime's %z does, e.g. +0530"""
+    sign = "-" if offset < 0 else "+"
+    minutes = abs(offset) // 60
+    return f"{sign}{minutes // 60:02d}{separator}{minutes % 60:02d}"
+
+
+def local_to_utc(table, wall):
+    """Vectorized wall-clock (as if UTC) -> UTC epoch conversion for one zone.
+
+    Repeated wall times during a fall-back resolve to the earlier instant;
+    times skipped by a spring-forward move forward by the size of the gap.
+    """
+    wall = np.asarray(wall)
+    # Transitions are always more than a day apart, so the offsets a day
+    # either side are the only two a wall time can map through
+    before = table.offsets_at(wall - 86400)
+    after = table.offsets_at(wall + 86400)
+    first, second = wall - before, wall - after
+    first_valid = table.offsets_at(first) == before
+    second_valid = table.offsets_at(second) == after
+    return np.where(first_valid & second_valid, np.minimum(first, second), np.where(second_valid, second, first))
+
+
+def verify(names, backend=None, years=range(2000, 2031), step=6 * 3600):
+    """Compare table lookups with the backend's own localization; return the mismatches found"""
+    backend = backend or get_backend()
+    mismatches = []
+    for name in names:
+        tz = backend.tzinfo(name)
+        table = build_zone_table(name, backend)
+        start = calendar.timegm((years[0], 1, 1, 0, 0, 0))
+        end = calendar.timegm((years[-1] + 1, 1, 1, 0, 0, 0))
+        edges = [t + d for t in table.transitions if start <= t < end for d in (-1, 0)]
+        for ts in sorted(set(range(start, end, step)).union(edges)):
+            expected = datetime.fromtimestamp(ts, tz)
+            local = table.localize(ts)
+            if (
+                local.offset != int(expected.utcoffset().total_seconds())
+                or local.abbreviation != expected.tzname()
+                or local.tm[:6] != expected.timetuple()[:6]
+            ):
+                mismatches.append((name, ts))
+    return mismatches
+
+
+if __name__ == "__main__":
+    from app import WORLD_CITIES
+
+    names = sorted({city["timezone"] for city in WORLD_CITIES.values()})
+    failed = False
+    for backend_name in BACKENDS:
+        try:
+            backend = BACKENDS[backend_name]()
+        except ImportError:
+            print(f"{backend_name}: not installed")
+            continue
+        mismatches = verify(names, backend)
+        for name, ts in mismatches[:20]:
+            print(f"{backend_name} mismatch: {name} at {ts}")
+        print(f"{backend_name}: checked {len(names)} zones, {len(mismatches)} mismatches")
+        failed = failed or bool(mismatches)
+    raise SystemExit(1 if failed else 0)